@@ -5,11 +5,17 @@ import logging
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.redis import RedisStorage
+from aioredis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
 
+from apps.images.warmup import keep_images_ready
 from conf import bot_settings
+from database.engine import postgres_engine
 from database.handlers.setup import setup_database
-from database.handlers.utils.redis_client import connect_redis_url
+from database.handlers.utils.redis_client import connect_redis_url, close_redis
+from database.handlers.utils.fsm_storage import RedisHashStorage
+from database.handlers.utils.telegram_file_cache import telegram_files
+from database.models import ItemMeta, Deliveries
 from handlers.auth import router as auth_router
 from handlers.app import router as app_router
 from handlers.account import router as account_router
@@ -17,33 +23,79 @@ from handlers.purchases import router as purchases_router
 from handlers.cart import router as cart_router
 from handlers.errors import router as error_router
 from handlers.payment import router as payment_router
+from handlers.admin import router as admin_router
+from handlers.utils.catalog import refresh_catalog, keep_catalog_fresh
 from middlewares.auth import AuthUserMiddleware
+from middlewares.fsm import FSMUnitOfWorkMiddleware, KeyedEventIsolation
+from middlewares.utils.state import rebuild_registered_users
+from middlewares.settings import (
+    CATALOG_INDEX_REFRESH_INTERVAL, IMAGE_WARMUP_CONCURRENCY, IMAGE_WARMUP_INTERVAL, FILE_DIGESTS_SWEEP_INTERVAL,
+)
 
 from bot import BOT_TOKEN, bot
 from middlewares.cart import CartIsFullFiledMiddleware
+from serializers.serializers import MsgPackCodec
 
 SERVER_URL = bot_settings.server_token.get_secret_value()
 WEBHOOK_URL = f'https://api.telegram.org/bot{BOT_TOKEN}/setWebhook?url={SERVER_URL}'
 
 
-async def on_startup(bot: Bot) -> None:
+async def on_startup(bot: Bot, dispatcher: Dispatcher, redis) -> None:
     await setup_database()
 
+    # Без фильтра проверка регистрации идет в базу, его можно перестроить позже командой /rebuild_users_filter.
+    try:
+        registered_count = await rebuild_registered_users(redis)
+    except (SQLAlchemyError, RedisError) as err:
+        logging.getLogger(__name__).error(str(err))
+    else:
+        logging.getLogger(__name__).info('Registered users filter built: %s', registered_count)
+
+    # Без справочников и индекса каталог работает через запросы к базе, фоновая задача загрузит их позже.
+    try:
+        await refresh_catalog()
+    except SQLAlchemyError as sql_err:
+        logging.getLogger(__name__).error(str(sql_err))
+
+    dispatcher['catalog_index_task'] = asyncio.create_task(keep_catalog_fresh(CATALOG_INDEX_REFRESH_INTERVAL))
+
+    dispatcher['images_task'] = asyncio.create_task(keep_images_ready(
+        bot, redis, bot_settings.warmup_chat_id, IMAGE_WARMUP_CONCURRENCY, IMAGE_WARMUP_INTERVAL,
+    ))
+
+    telegram_files.digests.start_sweeper(FILE_DIGESTS_SWEEP_INTERVAL)
+
     await bot.delete_webhook(drop_pending_updates=True)
     await bot.set_webhook(WEBHOOK_URL)
 
 
+async def on_shutdown(dispatcher: Dispatcher, redis) -> None:
+    logging.getLogger(__name__).info('Postgres pool: %s', postgres_engine.pool_status)
+    logging.getLogger(__name__).info('Image digests: %s', telegram_files.digests.metrics.as_dict())
+
+    dispatcher['catalog_index_task'].cancel()
+    dispatcher['images_task'].cancel()
+
+    await telegram_files.digests.stop_sweeper()
+
+    await postgres_engine.dispose()
+    await close_redis(redis)
+
+
 def main() -> None:
     loop = asyncio.new_event_loop()
     r_con = loop.run_until_complete(connect_redis_url())
     loop.close()
 
-    redis_storage = RedisStorage(r_con)
+    redis_storage = RedisHashStorage(r_con, codec=MsgPackCodec(enums=(ItemMeta.Gender, Deliveries.Statuses)))
 
-    auth_middleware = AuthUserMiddleware(storage=redis_storage)
+    auth_middleware = AuthUserMiddleware()
     cart_filled_middleware = CartIsFullFiledMiddleware()
 
-    dp = Dispatcher(storage=redis_storage)
+    # Штатный FSMContextMiddleware заменяется на FSMUnitOfWorkMiddleware, апдейты одного пользователя идут по очереди.
+    dp = Dispatcher(storage=redis_storage, redis=r_con, disable_fsm=True)
+    dp.fsm = FSMUnitOfWorkMiddleware(storage=redis_storage, events_isolation=KeyedEventIsolation())
+    dp.update.outer_middleware(dp.fsm)
     dp.message.outer_middleware(auth_middleware)
     dp.callback_query.outer_middleware(auth_middleware)
     dp.callback_query.outer_middleware(cart_filled_middleware)
@@ -54,9 +106,11 @@ def main() -> None:
         purchases_router,
         cart_router,
         payment_router,
+        admin_router,
         error_router,
     )
     dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
     webhook_requests_handler = SimpleRequestHandler(
         dispatcher=dp,
@@ -1,57 +1,153 @@
-from typing import Optional, Union, Dict
+from decimal import Decimal
+from typing import Optional
 
-from handlers.utils.named_entities import Item
+from aioredis import Redis
+
+from apps.cart.contents import CartContents
+from middlewares.settings import CART_TTL
+from serializers.serializers import MsgPackCodec
 
 
 class Cart:
-    def __init__(self, tg_id: int):
+    """ Корзина пользователя в Redis, общая для всех процессов бота.
+
+    cart:<tg_id>:lines - хэш «позиция -> количество», позиция - это (item_id, size, color, sex);
+    cart:<tg_id>:items - хэш «позиция -> описание товара» и «позиция:price -> цена в копейках»;
+    cart:<tg_id>:meta  - хэш с общим количеством (qty), суммой в копейках (total)
+                         и количеством по каждому товару (item:<item_id>).
+
+    Все изменения выполняются атомарно скриптами Lua, каждое обращение продлевает TTL корзины.
+    """
+
+    # Позиция оплачивается по цене, запомненной при первом добавлении: по ней же сумма уменьшается при удалении
+    # и считается сумма в CartContents, поэтому смена цены товара не сбивает total.
+    ADD_LUA = """
+local qty = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if qty == 1 then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2], ARGV[1] .. ':price', ARGV[3])
+end
+local price = redis.call('HGET', KEYS[2], ARGV[1] .. ':price') or ARGV[3]
+redis.call('HINCRBY', KEYS[3], 'total', price)
+redis.call('HINCRBY', KEYS[3], 'qty', 1)
+redis.call('HINCRBY', KEYS[3], 'item:' .. ARGV[5], 1)
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+end
+return qty
+"""
+
+    # Если точной позиции нет, убирается первая позиция с тем же item_id.
+    REMOVE_LUA = """
+local line = ARGV[1]
+if redis.call('HEXISTS', KEYS[1], line) == 0 then
+    line = nil
+    for _, candidate in ipairs(redis.call('HKEYS', KEYS[1])) do
+        if string.sub(candidate, 1, #ARGV[2]) == ARGV[2] then
+            line = candidate
+            break
+        end
+    end
+end
+if not line then
+    return -1
+end
+local price = redis.call('HGET', KEYS[2], line .. ':price') or 0
+local qty = redis.call('HINCRBY', KEYS[1], line, -1)
+if qty <= 0 then
+    redis.call('HDEL', KEYS[1], line)
+    redis.call('HDEL', KEYS[2], line, line .. ':price')
+end
+if redis.call('HINCRBY', KEYS[3], 'qty', -1) <= 0 then
+    redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+    return 0
+end
+if redis.call('HINCRBY', KEYS[3], 'item:' .. ARGV[4], -1) <= 0 then
+    redis.call('HDEL', KEYS[3], 'item:' .. ARGV[4])
+end
+redis.call('HINCRBY', KEYS[3], 'total', -price)
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+return qty
+"""
+
+    codec = MsgPackCodec()
+
+    def __init__(self, redis: Redis, tg_id: int, ttl: int = CART_TTL):
+        self._redis = redis
         self._tg_id = tg_id
-        self._items = []
+        self._ttl = ttl
+
+        self._lines_key = f'cart:{tg_id}:lines'
+        self._items_key = f'cart:{tg_id}:items'
+        self._meta_key = f'cart:{tg_id}:meta'
 
-    async def add_item(self, item: Item) -> None:
-        self._items.append(item)
+    @property
+    def _keys(self) -> list:
+        return [self._lines_key, self._items_key, self._meta_key]
 
-    async def get_item(self, item_id: int):
+    @staticmethod
+    def _price_in_cents(item: dict) -> int:
+        return int(Decimal(str(item.get('price', 0))) * 100)
 
-        for item in self._items:
-            if item.get('id') == item_id:
-                return item
+    async def add_item(self, item: dict) -> int:
+        """ Добавляет одну единицу товара и возвращает количество в этой позиции. """
 
-        return -1
+        return await self._redis.eval(
+            self.ADD_LUA, 3, *self._keys,
+            CartContents.variant(item), self.codec.dumps(item), self._price_in_cents(item), self._ttl,
+            item.get('id'),
+        )
 
     async def remove_item(self, item: dict) -> Optional[int]:
-        try:
+        """ Убирает одну единицу товара. Возвращает остаток в позиции либо -1, если товара в корзине нет. """
 
-            item_id = item.get('id')
+        return await self._redis.eval(
+            self.REMOVE_LUA, 3, *self._keys,
+            CartContents.variant(item), f'{item.get("id")}|', self._ttl, item.get('id'),
+        )
 
-            for item in self._items:
-                if item.get('id') == item_id:
-                    self._items.remove(item)
-                    break
-        except ValueError:
-            return -1
+    async def load(self) -> CartContents:
+        """ Читает корзину целиком одним запросом. """
 
-    async def calculate_sum_of_items(self) -> int:
-        return round(sum(item.get('price', 0) for item in self._items), 2)
+        contents = CartContents()
 
-    async def clean_up(self):
-        self._items.clear()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._lines_key)
+            pipe.hgetall(self._items_key)
+            lines, items = await pipe.execute()
 
-    async def fill_up(self, previous_data):
-        if previous_data is not None:
-            self._items = previous_data
+        for line, qty in lines.items():
+            if line in items:
+                contents.add(self.codec.loads(items[line]), int(qty))
 
-    @property
-    async def get_items(self) -> list:
-        return self._items
+        return contents
 
+    async def count_item(self, item_id: int) -> int:
+        """ Количество единиц товара в корзине по всем позициям. """
 
-class CartManager:
+        qty = await self._redis.hget(self._meta_key, f'item:{item_id}')
+
+        return int(qty) if qty else 0
+
+    async def count_items(self) -> int:
+
+        qty = await self._redis.hget(self._meta_key, 'qty')
 
-    _carts = {}
+        return int(qty) if qty else 0
+
+    async def calculate_sum_of_items(self) -> Decimal:
+
+        total = await self._redis.hget(self._meta_key, 'total')
+
+        return Decimal(int(total) if total else 0) / 100
+
+    async def clean_up(self) -> None:
+        await self._redis.delete(*self._keys)
+
+
+class CartManager:
 
     @classmethod
-    async def get_cart(cls, tg_id: int) -> Cart:
-        if tg_id not in cls._carts:
-            cls._carts[tg_id] = Cart(tg_id)
-        return cls._carts[tg_id]
+    async def get_cart(cls, tg_id: int, redis: Redis) -> Cart:
+        return Cart(redis, tg_id)
@@ -0,0 +1,127 @@
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+
+NO_FILTER = 'Без фильтра'
+
+
+class CartContents:
+    """ Содержимое корзины, сгруппированное по позициям.
+
+    Позиция - это товар в конкретном варианте (item_id, size, color, sex), для нее хранится количество.
+    Общее количество, сумма и количество по каждому товару пересчитываются при каждом изменении,
+    поэтому добавление, удаление, подсчет и сумма выполняются за O(1).
+    """
+
+    def __init__(self):
+        self._items: Dict[str, dict] = {}
+        self._quantities: Dict[str, int] = {}
+        self._variants: Dict[int, Dict[str, None]] = {}
+        self._per_item: Dict[int, int] = {}
+        self._qty = 0
+        self._total = Decimal(0)
+
+    @staticmethod
+    def variant(item: dict) -> str:
+        return '|'.join(str(item.get(field)) for field in ('id', 'size', 'color', 'sex'))
+
+    @staticmethod
+    def _price(item: dict) -> Decimal:
+        return Decimal(str(item.get('price', 0)))
+
+    def add(self, item: dict, qty: int = 1) -> int:
+        """ Добавляет qty единиц товара и возвращает количество в позиции. """
+
+        variant = self.variant(item)
+        item_id = item.get('id')
+
+        if variant not in self._quantities:
+            self._items[variant] = item
+            self._quantities[variant] = 0
+            self._variants.setdefault(item_id, {})[variant] = None
+
+        self._quantities[variant] += qty
+        self._per_item[item_id] = self._per_item.get(item_id, 0) + qty
+        self._qty += qty
+        self._total += self._price(item) * qty
+
+        return self._quantities[variant]
+
+    def remove(self, item: dict) -> int:
+        """ Убирает одну единицу товара.
+
+        Если точной позиции нет, убирается любая позиция того же товара.
+        Возвращает остаток в позиции либо -1, если товара в корзине нет.
+        """
+
+        item_id = item.get('id')
+        variant = self.variant(item)
+
+        if variant not in self._quantities:
+            variants = self._variants.get(item_id)
+            if not variants:
+                return -1
+            variant = next(iter(variants))
+
+        stored_item = self._items[variant]
+
+        self._quantities[variant] -= 1
+        self._per_item[item_id] -= 1
+        self._qty -= 1
+        self._total -= self._price(stored_item)
+
+        qty = self._quantities[variant]
+
+        if not qty:
+            del self._quantities[variant], self._items[variant]
+            del self._variants[item_id][variant]
+            if not self._variants[item_id]:
+                del self._variants[item_id], self._per_item[item_id]
+
+        return qty
+
+    def count(self, item_id: int) -> int:
+        """ Количество единиц товара по всем его позициям. """
+
+        return self._per_item.get(item_id, 0)
+
+    @property
+    def total(self) -> Decimal:
+        return self._total
+
+    def __len__(self) -> int:
+        return self._qty
+
+    def __iter__(self) -> Iterator[dict]:
+        """ Позиции корзины с количеством, в порядке добавления. """
+
+        for variant, item in self._items.items():
+            yield {**item, 'qty': self._quantities[variant]}
+
+    def order_lines(self, order_id: Optional[int] = None) -> List[dict]:
+        """ Строки заказа: одна строка на позицию, «Без фильтра» заменяется на NULL. """
+
+        order_lines: Dict[tuple, dict] = {}
+
+        for variant, item in self._items.items():
+
+            if item.get('id') is None:
+                continue
+
+            sex = item.get('sex')
+
+            line = {
+                'order_id': order_id,
+                'item_id': item.get('id'),
+                'color': item.get('color') if item.get('color') != NO_FILTER else None,
+                'size': item.get('size') if item.get('size') != NO_FILTER else None,
+                'sex': sex.split('.')[-1] if sex is not None and sex != NO_FILTER else None,
+            }
+
+            key = tuple(line.values())
+
+            if key in order_lines:
+                order_lines[key]['qty'] += self._quantities[variant]
+            else:
+                order_lines[key] = {**line, 'qty': self._quantities[variant]}
+
+        return list(order_lines.values())
@@ -0,0 +1,45 @@
+import unittest
+from decimal import Decimal
+
+from contents import CartContents
+
+
+class TestCartContents(unittest.TestCase):
+
+    def setUp(self):
+        self.contents = CartContents()
+        self.item = {'id': 1, 'price': Decimal('10.50'), 'size': '42', 'color': 'Белый', 'sex': 'Sex.M'}
+
+    def test001_add_groups_same_variant(self):
+        self.assertEqual(self.contents.add(self.item), 1)
+        self.assertEqual(self.contents.add(self.item), 2)
+        self.assertEqual(self.contents.add({**self.item, 'size': '43'}), 1)
+
+        self.assertEqual(len(self.contents), 3)
+        self.assertEqual(self.contents.count(1), 3)
+        self.assertEqual(self.contents.total, Decimal('31.50'))
+        self.assertEqual([item['qty'] for item in self.contents], [2, 1])
+
+    def test002_remove_falls_back_to_any_variant(self):
+        self.contents.add(self.item)
+        self.contents.add({'id': 2, 'price': 5})
+
+        self.assertEqual(self.contents.remove({'id': 1}), 0)
+        self.assertEqual(self.contents.remove({'id': 1}), -1)
+        self.assertEqual(self.contents.count(1), 0)
+        self.assertEqual(len(self.contents), 1)
+        self.assertEqual(self.contents.total, Decimal(5))
+
+    def test003_order_lines(self):
+        self.contents.add(self.item, 2)
+        self.contents.add({'id': 2, 'price': 5, 'size': 'Без фильтра', 'color': 'Без фильтра', 'sex': 'Без фильтра'})
+        self.contents.add({'id': 2, 'price': 5, 'size': None, 'color': None, 'sex': None})
+
+        self.assertEqual(self.contents.order_lines(7), [
+            {'order_id': 7, 'item_id': 1, 'color': 'Белый', 'size': '42', 'sex': 'M', 'qty': 2},
+            {'order_id': 7, 'item_id': 2, 'color': None, 'size': None, 'sex': None, 'qty': 2},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
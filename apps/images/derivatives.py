@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update, values, column, Integer, String
+
+from database.models import Images
+from database.session import AsyncSessionLocal
+from utils.image_derivatives import store_derivative
+
+# id изображения -> путь, который не удалось обработать. Изображение пропускается, пока его path не изменится.
+failed_images: Dict[int, str] = {}
+
+
+async def optimize_images(media_root: str, max_side: int, quality: int, workers: int, batch: int) -> int:
+    """ Строит производные изображения для всех Images без derivative_path в пуле из workers процессов.
+
+    Изображения обрабатываются пачками по batch, пути пачки записываются одним UPDATE:
+    каждая транзакция с изменением витрины меняет версию каталога и перестраивает индексы во всех процессах.
+    Изображения, которые не удалось обработать, запоминаются в failed_images и не обрабатываются повторно
+    на каждом проходе, пока у них не изменится path.
+    Возвращает число обработанных изображений.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            rows = (await session.execute(
+                select(Images.id, Images.path).where(Images.derivative_path.is_(None)).order_by(Images.id)
+            )).all()
+
+    rows = [(image_id, path) for image_id, path in rows if failed_images.get(image_id) != path]
+
+    if not rows:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    source_bytes, done = 0, 0
+    unique_paths = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        async def optimize(image_id: int, source_path: str) -> Optional[Tuple[int, str, str]]:
+
+            try:
+                path = await loop.run_in_executor(pool, store_derivative, source_path, media_root, max_side, quality)
+            except BrokenProcessPool:
+                # Пул больше не принимает задачи, проход прерывается и повторяется со следующим пулом.
+                raise
+            except Exception as err:
+                # Кроме OSError Pillow бросает DecompressionBombError, ValueError и другие исключения.
+                logger.error('Image optimization failed: %s: %s', source_path, err)
+                failed_images[image_id] = source_path
+                return None
+
+            return image_id, source_path, path
+
+        for offset in range(0, len(rows), batch):
+            results = [
+                result for result in await asyncio.gather(*(optimize(*row) for row in rows[offset:offset + batch]))
+                if result is not None
+            ]
+
+            if not results:
+                continue
+
+            derivatives = values(
+                column('id', Integer), column('source_path', String), column('path', String), name='derivatives',
+            ).data(results)
+
+            # Если path изменился, пока изображение обрабатывалось, производная устарела и не записывается.
+            async with AsyncSessionLocal() as session:
+                async with session.begin():
+                    await session.execute(
+                        update(Images).where(
+                            Images.id == derivatives.c.id, Images.path == derivatives.c.source_path,
+                        ).values(derivative_path=derivatives.c.path)
+                    )
+
+            for _, source_path, path in results:
+                source_bytes += os.path.getsize(source_path)
+                unique_paths.add(path)
+
+            done += len(results)
+
+    logger.info(
+        'Images optimized: %s of %s in %.1f s, %.2f MiB -> %.2f MiB in %s files',
+        done, len(rows), time.perf_counter() - start,
+        source_bytes / 2 ** 20, sum(os.path.getsize(path) for path in unique_paths) / 2 ** 20, len(unique_paths),
+    )
+
+    return done
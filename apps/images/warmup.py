@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import time
+from collections import namedtuple
+from typing import Optional
+
+import aiogram.exceptions
+import sqlalchemy.exc
+from aiogram import Bot
+from aiogram.types import FSInputFile
+from aioredis import Redis
+from sqlalchemy import select, func
+
+from apps.images.derivatives import optimize_images
+from database.handlers.utils.telegram_file_cache import telegram_files
+from database.models import Images
+from database.session import AsyncSessionLocal
+from middlewares.settings import (
+    IMAGE_MEDIA_ROOT, IMAGE_MAX_SIDE, IMAGE_JPEG_QUALITY, IMAGE_OPTIMIZE_WORKERS, IMAGE_OPTIMIZE_BATCH,
+)
+
+WarmUpReport = namedtuple('WarmUpReport', ['uploaded', 'failed', 'bytes', 'seconds'])
+
+# Прогресс пишется в лог каждые PROGRESS_STEP обработанных изображений.
+PROGRESS_STEP = 100
+
+
+async def upload_image(bot: Bot, r_cli: Redis, chat_id: int, path: str) -> int:
+    """ Загружает изображение в чат прогрева и запоминает file_id. Возвращает число загруженных байт. """
+
+    photo = await telegram_files.photo(r_cli, path)
+
+    # Изображение уже загрузил другой процесс или показ карточки.
+    if not isinstance(photo, FSInputFile):
+        return 0
+
+    while True:
+        try:
+            message = await bot.send_photo(chat_id, photo, disable_notification=True)
+            break
+        except aiogram.exceptions.TelegramRetryAfter as retry_err:
+            await asyncio.sleep(retry_err.retry_after)
+
+    await telegram_files.remember(r_cli, path, message)
+
+    try:
+        await bot.delete_message(chat_id, message.message_id)
+    except aiogram.exceptions.TelegramBadRequest:
+        ...
+
+    return os.path.getsize(path)
+
+
+async def warm_up_images(bot: Bot, r_cli: Redis, chat_id: int, concurrency: int) -> WarmUpReport:
+    """ Загружает в чат прогрева все изображения без file_id, не больше concurrency загрузок одновременно.
+
+    Производные изображения бывают общими для нескольких записей Images, каждый путь загружается один раз.
+    Первый покупатель, открывший карточку, получает изображение по file_id и не ждет загрузки.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            paths = (await session.scalars(
+                select(Images.display_path).where(Images.file_id.is_(None))
+                .group_by(Images.display_path).order_by(func.min(Images.id))
+            )).all()
+
+    if not paths:
+        return WarmUpReport(0, 0, 0, 0.0)
+
+    uploaded, failed, uploaded_bytes, done = 0, 0, 0, 0
+    start = time.perf_counter()
+
+    async def warm_up(path: str) -> None:
+        nonlocal uploaded, failed, uploaded_bytes, done
+
+        try:
+            size = await upload_image(bot, r_cli, chat_id, path)
+        except (OSError, aiogram.exceptions.TelegramAPIError) as err:
+            logger.error('Image warm-up failed: %s: %s', path, err)
+            failed += 1
+        else:
+            uploaded += size > 0
+            uploaded_bytes += size
+
+        done += 1
+        if done % PROGRESS_STEP == 0:
+            elapsed = time.perf_counter() - start
+            logger.info('Image warm-up: %s/%s, %.1f images/s', done, len(paths), done / elapsed)
+
+    # concurrency загрузчиков разбирают общий итератор путей, корутины на каждый путь заранее не создаются.
+    pending = iter(paths)
+
+    async def uploader() -> None:
+        for path in pending:
+            await warm_up(path)
+
+    await asyncio.gather(*(uploader() for _ in range(min(concurrency, len(paths)))))
+
+    report = WarmUpReport(uploaded, failed, uploaded_bytes, time.perf_counter() - start)
+
+    logger.info(
+        'Image warm-up finished: %s uploaded, %s failed, %.1f images/s, %.2f MiB/s',
+        report.uploaded, report.failed,
+        report.uploaded / report.seconds, report.bytes / 2 ** 20 / report.seconds,
+    )
+
+    return report
+
+
+async def keep_images_ready(bot: Bot, r_cli: Redis, chat_id: Optional[int], concurrency: int, interval: int) -> None:
+    """ Фоновая задача: раз в interval секунд обрабатывает новые изображения каталога и загружает их в чат прогрева.
+
+    Прогрев идет после обработки, чтобы в Telegram попадали уже производные изображения. Без chat_id прогрев выключен.
+    """
+
+    while True:
+        try:
+            await optimize_images(
+                IMAGE_MEDIA_ROOT, IMAGE_MAX_SIDE, IMAGE_JPEG_QUALITY, IMAGE_OPTIMIZE_WORKERS, IMAGE_OPTIMIZE_BATCH,
+            )
+
+            if chat_id is not None:
+                await warm_up_images(bot, r_cli, chat_id, concurrency)
+        except sqlalchemy.exc.SQLAlchemyError as sql_err:
+            logging.getLogger(__name__).error(str(sql_err))
+        # Любая ошибка прохода (Redis, пул процессов, Pillow) не должна останавливать задачу до перезапуска бота.
+        except Exception:
+            logging.getLogger(__name__).exception('Image pass failed')
+
+        await asyncio.sleep(interval)
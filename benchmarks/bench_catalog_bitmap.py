@@ -0,0 +1,107 @@
+""" Поиск страницы каталога в битовом индексе и запросом к catalog_search на 10 000 и 1 000 000 товаров.
+
+Для SQL замеряется запрос каталога с LIMIT 2, для индекса - пересечение термов и два id после курсора.
+Чтение показываемой карточки по первичному ключу одинаково в обоих случаях и не замеряется.
+
+Таблицы создаются во временной схеме bench_commerce базы из POSTGRES_URL и удаляются после замера.
+Витрина заполняется функцией обновления по одному товару, на 1 000 000 товаров это занимает несколько минут.
+Запуск из корня проекта: python -m benchmarks.bench_catalog_bitmap
+"""
+import asyncio
+import time
+
+from sqlalchemy import text, select
+
+from benchmarks.bench_catalog_indexes import BENCH_SCHEMA, CATALOG_TABLES, CASES, seed_statements
+from database.engine import postgres_engine
+from database.handlers.migrations import populate_item_variants, catalog_search_ddl, backfill_catalog_search
+from database.models import Base, CatalogSearch
+from handlers.utils.catalog import catalog_query, catalog_terms, item_terms
+from utils.bitmap_index import BitmapIndex
+
+SIZES = (10000, 1000000)
+REPEATS = 200
+
+
+async def sql_lookups(con) -> dict:
+
+    results = {}
+
+    for case_name, cursor in CASES.items():
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            (await con.execute(catalog_query(cursor).limit(2))).all()
+        results[case_name] = (time.perf_counter() - start) / REPEATS * 1000
+
+    return results
+
+
+def bitmap_lookups(index: BitmapIndex) -> dict:
+
+    results = {}
+
+    for case_name, cursor in CASES.items():
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            BitmapIndex.after(index.match(*catalog_terms(cursor)), cursor.last_id, 2)
+        results[case_name] = (time.perf_counter() - start) / REPEATS * 1000
+
+    return results
+
+
+async def measure(engine, items_count: int) -> tuple:
+
+    tables = [table for table in Base.metadata.sorted_tables if table.schema == 'commerce' and table.name in CATALOG_TABLES]
+
+    async with engine.begin() as con:
+        await con.execute(text(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE'))
+        await con.execute(text(f'CREATE SCHEMA {BENCH_SCHEMA}'))
+        await con.run_sync(Base.metadata.create_all, tables=tables)
+
+        for statement in seed_statements(BENCH_SCHEMA, items_count):
+            await con.execute(text(statement))
+
+        await con.execute(populate_item_variants())
+
+        for statement in catalog_search_ddl(BENCH_SCHEMA):
+            await con.execute(text(statement))
+        await con.execute(text(backfill_catalog_search(BENCH_SCHEMA)))
+
+        for table in CATALOG_TABLES:
+            await con.execute(text(f'ANALYZE {BENCH_SCHEMA}.{table}'))
+
+    async with engine.connect() as con:
+        start = time.perf_counter()
+        rows = await con.stream(select(CatalogSearch.item_id, CatalogSearch.brand_id, CatalogSearch.variant_keys))
+        index = BitmapIndex.build(
+            [(item_id, item_terms(brand_id, variant_keys)) async for item_id, brand_id, variant_keys in rows],
+        )
+        build_time = time.perf_counter() - start
+
+        sql = await sql_lookups(con)
+
+    return build_time, index.memory_size(), sql, bitmap_lookups(index)
+
+
+async def main() -> None:
+
+    engine = postgres_engine.engine.execution_options(schema_translate_map={'commerce': BENCH_SCHEMA})
+
+    try:
+        for items_count in SIZES:
+            build_time, memory_size, sql, bitmap = await measure(engine, items_count)
+
+            print(f'\n{items_count} items: index built in {build_time:.2f} s, {memory_size / 2 ** 20:.1f} MiB')
+            print(f'{"filters":<22}{"sql, ms":>12}{"bitmap, ms":>14}')
+
+            for case_name in CASES:
+                print(f'{case_name:<22}{sql[case_name]:>12.3f}{bitmap[case_name]:>14.4f}')
+
+    finally:
+        async with engine.begin() as con:
+            await con.execute(text(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE'))
+        await postgres_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+""" Планы и время запроса каталога без индексов фильтров и с ними на каталоге из 100 000 товаров.
+
+Варианты товаров заполняются из item_meta той же миграцией, что и в рабочей базе,
+витрина catalog_search - теми же функциями и триггерами.
+
+Таблицы создаются во временной схеме bench_commerce базы из POSTGRES_URL и удаляются после замера.
+Запуск из корня проекта: python -m benchmarks.bench_catalog_indexes
+"""
+import asyncio
+import json
+
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from callback_data.callback_data import AvailableItemsCallbackData
+from database.engine import postgres_engine
+from database.handlers.migrations import (
+    metadata_indexes, populate_item_variants, catalog_search_ddl, backfill_catalog_search,
+)
+from database.models import Base
+from handlers.utils.catalog import catalog_query
+
+BENCH_SCHEMA = 'bench_commerce'
+ITEMS_COUNT = 100000
+
+CATALOG_TABLES = ('brands', 'colors', 'sizes', 'sexes', 'items', 'images', 'items_images', 'item_meta', 'item_variants',
+                  'catalog_search')
+FILTER_INDEXES = (
+    'idx_item_meta_size',
+    'idx_item_meta_color',
+    'idx_item_meta_sex',
+    'idx_items_brand_id',
+    'idx_items_images_image_id',
+    'idx_item_variants_filters',
+    'idx_catalog_search_variant_keys',
+    'idx_catalog_search_brand_id',
+)
+
+COLORS = ('черный', 'белый', 'серый', 'синий', 'красный', 'зеленый', 'желтый', 'бежевый', 'розовый', 'хаки', 'бордовый', 'голубой')
+
+CASES = {
+    'без фильтров': AvailableItemsCallbackData(),
+    'бренд': AvailableItemsCallbackData(brand=17),
+    'размер': AvailableItemsCallbackData(size=15),
+    'цвет': AvailableItemsCallbackData(color=3),
+    'размер + цвет + пол': AvailableItemsCallbackData(size=15, color=3, sex=1),
+    'все фильтры': AvailableItemsCallbackData(brand=17, size=15, color=3, sex=1),
+}
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+def seed_statements(schema: str, items_count: int = ITEMS_COUNT) -> list:
+
+    colors = ', '.join(f"'{color}'" for color in COLORS)
+
+    return [
+        f"INSERT INTO {schema}.brands (title) SELECT 'Бренд ' || g FROM generate_series(1, 200) g",
+        f'INSERT INTO {schema}.colors (title) SELECT unnest(ARRAY[{colors}])',
+        f'INSERT INTO {schema}.sizes (title) SELECT 35 + g * 0.5 FROM generate_series(0, 22) g',
+        f"INSERT INTO {schema}.sexes (title) VALUES ('male'), ('female')",
+        f"INSERT INTO {schema}.items (title, description, price, available, brand_id) "
+        f"SELECT 'Товар ' || g, 'Описание товара ' || g, 1000 + g % 9000, true, 1 + g % 200 "
+        f"FROM generate_series(1, {items_count}) g",
+        f"INSERT INTO {schema}.images (path) SELECT '/media/items/' || g || '.jpg' FROM generate_series(1, {items_count}) g",
+        f'INSERT INTO {schema}.items_images (item_id, image_id) SELECT g, g FROM generate_series(1, {items_count}) g',
+        # У каждого товара 4 размера и 2 цвета, распределенные детерминированно по id.
+        f'INSERT INTO {schema}.item_meta (item_id, size, color, sex) '
+        f'SELECT id, '
+        f'ARRAY[35 + (id * 7 % 23) * 0.5, 35 + ((id * 11 + 3) % 23) * 0.5, '
+        f'35 + ((id * 13 + 5) % 23) * 0.5, 35 + ((id * 17 + 7) % 23) * 0.5], '
+        f'ARRAY[(ARRAY[{colors}])[1 + id % 12], (ARRAY[{colors}])[1 + (id / 12) % 12]], '
+        f"(CASE WHEN id % 2 = 0 THEN 'male' ELSE 'female' END)::{schema}.gender "
+        f'FROM {schema}.items',
+    ]
+
+
+def used_indexes(plan: dict) -> set:
+
+    indexes = {plan['Index Name']} if 'Index Name' in plan else set()
+
+    for subplan in plan.get('Plans', []):
+        indexes |= used_indexes(subplan)
+
+    return indexes
+
+
+async def explain_cases(con) -> dict:
+
+    results = {}
+
+    for case_name, cursor in CASES.items():
+        result = await con.execute(Explain(catalog_query(cursor).limit(2)))
+        raw_plan = result.scalar()
+        plan = (json.loads(raw_plan) if isinstance(raw_plan, str) else raw_plan)[0]
+
+        results[case_name] = plan['Execution Time'], plan['Plan']['Node Type'], used_indexes(plan['Plan'])
+
+    return results
+
+
+async def main() -> None:
+
+    engine = postgres_engine.engine.execution_options(schema_translate_map={'commerce': BENCH_SCHEMA})
+    tables = [table for table in Base.metadata.sorted_tables if table.schema == 'commerce' and table.name in CATALOG_TABLES]
+    indexes = metadata_indexes()
+
+    try:
+        async with engine.begin() as con:
+            await con.execute(text(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE'))
+            await con.execute(text(f'CREATE SCHEMA {BENCH_SCHEMA}'))
+            await con.run_sync(Base.metadata.create_all, tables=tables)
+
+            for name in FILTER_INDEXES:
+                await con.execute(text(f'DROP INDEX IF EXISTS {BENCH_SCHEMA}.{name}'))
+
+            for statement in seed_statements(BENCH_SCHEMA):
+                await con.execute(text(statement))
+
+            await con.execute(populate_item_variants())
+
+            for statement in catalog_search_ddl(BENCH_SCHEMA):
+                await con.execute(text(statement))
+            await con.execute(text(backfill_catalog_search(BENCH_SCHEMA)))
+
+            for table in CATALOG_TABLES:
+                await con.execute(text(f'ANALYZE {BENCH_SCHEMA}.{table}'))
+
+        async with engine.connect() as con:
+            without_indexes = await explain_cases(con)
+
+        async with engine.begin() as con:
+            for name in FILTER_INDEXES:
+                await con.run_sync(lambda sync_con, index=indexes[name]: index.create(sync_con, checkfirst=True))
+            for table in CATALOG_TABLES:
+                await con.execute(text(f'ANALYZE {BENCH_SCHEMA}.{table}'))
+
+        async with engine.connect() as con:
+            with_indexes = await explain_cases(con)
+
+    finally:
+        async with engine.begin() as con:
+            await con.execute(text(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE'))
+        await postgres_engine.dispose()
+
+    print(f'{"filters":<22}{"no indexes, ms":>16}{"indexes, ms":>14}  plan with indexes')
+
+    for case_name in CASES:
+        before, _, _ = without_indexes[case_name]
+        after, node_type, used = with_indexes[case_name]
+        print(f'{case_name:<22}{before:>16.2f}{after:>14.2f}  {node_type}: {", ".join(sorted(used)) or "-"}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
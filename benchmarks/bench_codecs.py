@@ -0,0 +1,100 @@
+""" Сравнение кодеков хранилища FSM на типичных состояниях пользователя.
+
+Запуск из корня проекта: python -m benchmarks.bench_codecs
+"""
+import json
+import timeit
+from decimal import Decimal
+
+from serializers.serializers import JsonCodec, MsgPackCodec
+
+
+def cart_state(items_count: int = 20) -> dict:
+
+    in_cart = [
+        {
+            'id': item_id,
+            'title': f'Кроссовки Balance {item_id}',
+            'description': 'Легкие беговые кроссовки с амортизирующей подошвой и дышащим верхом из сетки. ' * 2,
+            'price': Decimal('12990.00') + item_id,
+            'brand_name': 'balance',
+            'image_path': f'/srv/balance_bot/media/items/{item_id}/main.jpg',
+            'size': '42.50',
+            'color': 'черный',
+            'sex': 'male',
+        }
+        for item_id in range(items_count)
+    ]
+
+    return {
+        'in_cart': in_cart,
+        'current_item': in_cart[-1],
+        'shipping_addresses': {
+            address_id: ('RU', 'Москва', f'Тверская улица, {address_id}', '12-34', '79990000000')
+            for address_id in range(3)
+        },
+        'current_address': ('RU', 'Москва', 'Тверская улица, 1', '12-34', '79990000000'),
+        'current_address_id': 1,
+        'brand_filter': ':'.join(f'{brand_id},Бренд {brand_id}' for brand_id in range(1, 40)),
+        'last_bot_msg_id': 123456,
+        'last_bot_msg_photo_id': 123455,
+    }
+
+
+def paginator_state() -> dict:
+
+    return {
+        'current_item': {
+            'id': 1024,
+            'title': 'Кроссовки Balance 1024',
+            'description': 'Легкие беговые кроссовки с амортизирующей подошвой.',
+            'price': Decimal('12990.00'),
+            'brand_name': 'balance',
+            'image_path': '/srv/balance_bot/media/items/1024/main.jpg',
+        },
+        'current_filters': {'color': '3,черный', 'brand': '0,Без фильтра', 'sex': '1,male', 'size': '5,42.50'},
+        'has_next': True,
+        'has_prev': False,
+        'last_bot_msg_id': 123456,
+        'last_bot_msg_photo_id': 123455,
+    }
+
+
+class LegacyJsonCodec(JsonCodec):
+    """ Формат прежнего RedisStorage: json.dumps с экранированием не-ASCII символов. """
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, default=self._default).encode('utf-8')
+
+
+def bench(codec, state: dict, number: int) -> tuple:
+
+    # Хранилище кодирует каждое поле отдельно, поэтому и замеряется кодирование по полям.
+    encoded = {field: codec.dumps(value) for field, value in state.items()}
+    size = sum(len(field) + len(value) for field, value in encoded.items())
+
+    dumps_time = timeit.timeit(
+        lambda: {field: codec.dumps(value) for field, value in state.items()}, number=number,
+    )
+    loads_time = timeit.timeit(
+        lambda: {field: codec.loads(value) for field, value in encoded.items()}, number=number,
+    )
+
+    return size, dumps_time / number * 1e6, loads_time / number * 1e6
+
+
+def main(number: int = 20000) -> None:
+
+    codecs = {'json-ascii': LegacyJsonCodec(), 'json': JsonCodec(), 'msgpack': MsgPackCodec()}
+    states = {'cart (20 items)': cart_state(), 'paginator': paginator_state()}
+
+    print(f'{"state":<18}{"codec":<12}{"bytes":>8}{"encode, us":>13}{"decode, us":>13}')
+
+    for state_name, state in states.items():
+        for codec_name, codec in codecs.items():
+            size, dumps_us, loads_us = bench(codec, state, number)
+            print(f'{state_name:<18}{codec_name:<12}{size:>8}{dumps_us:>13.1f}{loads_us:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
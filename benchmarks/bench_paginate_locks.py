@@ -0,0 +1,61 @@
+""" Пропускная способность пагинации при глобальном замке и при замке на пользователя.
+
+Обращения к Redis, базе и Telegram заменены задержками asyncio.sleep.
+Запуск из корня проекта: python -m benchmarks.bench_paginate_locks
+"""
+import asyncio
+import contextlib
+import time
+
+from utils.keyed_lock import KeyedLock
+
+# Шаг курсора в Redis, чтение строки товара из базы, отправка фото и карточки в Telegram.
+REDIS_LATENCY = 0.001
+DATABASE_LATENCY = 0.002
+TELEGRAM_LATENCY = 0.005
+
+
+class GlobalLock:
+    """ Прежнее поведение PaginatorStorage: один asyncio.Lock на весь процесс. """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, key):
+        async with self._lock:
+            yield
+
+
+async def paginate(locks, tg_id: int) -> None:
+
+    async with locks(tg_id):
+        await asyncio.sleep(REDIS_LATENCY)
+        await asyncio.sleep(DATABASE_LATENCY)
+        await asyncio.sleep(TELEGRAM_LATENCY)
+
+
+async def run(locks, users: int, pages_per_user: int) -> float:
+
+    async def user(tg_id):
+        for _ in range(pages_per_user):
+            await paginate(locks, tg_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(tg_id) for tg_id in range(users)))
+
+    return users * pages_per_user / (time.perf_counter() - start)
+
+
+async def main(pages_per_user: int = 5) -> None:
+
+    print(f'{"users":>6}{"global lock, pages/s":>24}{"keyed lock, pages/s":>24}')
+
+    for users in (1, 100, 1000):
+        global_throughput = await run(GlobalLock(), users, pages_per_user)
+        keyed_throughput = await run(KeyedLock(), users, pages_per_user)
+        print(f'{users:>6}{global_throughput:>24.0f}{keyed_throughput:>24.0f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -2,8 +2,25 @@ from aiogram.filters.callback_data import CallbackData
 
 
 class PersonalOrdersCallbackData(CallbackData, prefix='ordered_items'):
-    flag: bool
+    """ Курсор истории покупок: позиция (заказ, товар) показанной покупки и направление. """
+
+    order_id: int = 0
+    item_id: int = 0
+    forward: bool = True
 
 
 class AvailableItemsCallbackData(CallbackData, prefix='items'):
-    flag: bool
+    """ Курсор каталога: id фильтров (0 - без фильтра), id показанного товара и направление. """
+
+    brand: int = 0
+    size: int = 0
+    color: int = 0
+    sex: int = 0
+    last_id: int = 0
+    forward: bool = True
+
+
+class ItemGalleryCallbackData(CallbackData, prefix='gallery'):
+    """ Остальные изображения товара, кроме главного. """
+
+    item_id: int
@@ -1,4 +1,6 @@
 import pathlib
+from typing import Optional
+
 from pydantic import SecretStr
 from pydantic_settings import SettingsConfigDict, BaseSettings
 
@@ -12,6 +14,8 @@ class BotSettings(BaseSettings):
     smtp_port: SecretStr
     email_username: SecretStr
     email_password: SecretStr
+    # Закрытый чат, куда заранее загружаются изображения каталога. Без него прогрев выключен.
+    warmup_chat_id: Optional[int] = None
 
     model_config = SettingsConfigDict(
         env_file=pathlib.Path.cwd() / 'balance_bot' / '.env',
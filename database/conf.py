@@ -1,4 +1,6 @@
 from pathlib import Path
+from typing import Final
+
 from pydantic_settings import BaseSettings, DotEnvSettingsSource
 
 
@@ -20,3 +22,20 @@ environments_settings = EnvironmentsSettings(
     env_file_encoding='utf-8',
     case_sensitive=True
 )
+
+# Файл окружения читается один раз при импорте, а не на каждое подключение.
+env_vars = environments_settings._load_env_vars()
+
+POSTGRES_URL = env_vars.get('POSTGRES_URL')
+
+POSTGRES_POOL_SIZE: Final[int] = int(env_vars.get('POSTGRES_POOL_SIZE', 10))
+POSTGRES_MAX_OVERFLOW: Final[int] = int(env_vars.get('POSTGRES_MAX_OVERFLOW', 20))
+POSTGRES_POOL_TIMEOUT: Final[float] = float(env_vars.get('POSTGRES_POOL_TIMEOUT', 30))
+POSTGRES_POOL_RECYCLE: Final[int] = int(env_vars.get('POSTGRES_POOL_RECYCLE', 1800))
+POSTGRES_POOL_PRE_PING: Final[bool] = env_vars.get('POSTGRES_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+REDIS_URL = env_vars.get('REDIS_URL')
+
+REDIS_MAX_CONNECTIONS: Final[int] = int(env_vars.get('REDIS_MAX_CONNECTIONS', 50))
+# Сколько секунд запрос ждет свободное соединение, когда заняты все REDIS_MAX_CONNECTIONS.
+REDIS_POOL_TIMEOUT: Final[float] = float(env_vars.get('REDIS_POOL_TIMEOUT', 10))
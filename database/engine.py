@@ -1,11 +1,34 @@
-from sqlalchemy import NullPool
 from sqlalchemy.ext.asyncio import create_async_engine
-from .conf import environments_settings
+
+from .conf import (
+    POSTGRES_URL,
+    POSTGRES_POOL_SIZE,
+    POSTGRES_MAX_OVERFLOW,
+    POSTGRES_POOL_TIMEOUT,
+    POSTGRES_POOL_RECYCLE,
+    POSTGRES_POOL_PRE_PING,
+)
+from .pool import MeteredAsyncPool
 
 
 class PostgresEngine:
-    db_url = environments_settings._load_env_vars().get('POSTGRES_URL')
-    engine = create_async_engine(db_url, poolclass=NullPool)
+    db_url = POSTGRES_URL
+    engine = create_async_engine(
+        db_url,
+        poolclass=MeteredAsyncPool,
+        pool_size=POSTGRES_POOL_SIZE,
+        max_overflow=POSTGRES_MAX_OVERFLOW,
+        pool_timeout=POSTGRES_POOL_TIMEOUT,
+        pool_recycle=POSTGRES_POOL_RECYCLE,
+        pool_pre_ping=POSTGRES_POOL_PRE_PING,
+    )
+
+    @property
+    def pool_status(self) -> dict:
+        return self.engine.pool.status_dict()
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
 
 
 postgres_engine = PostgresEngine()
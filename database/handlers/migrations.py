@@ -0,0 +1,375 @@
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import Index, Insert, select, text, case, any_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from database.models import Base, Items, ItemMeta, ItemVariants, Sizes, Colors
+
+Migration = Callable[[AsyncConnection], Awaitable[None]]
+
+# Миграции применяются по порядку и один раз, примененные записываются в public.schema_migrations.
+# create_all создает только недостающие таблицы, поэтому все, что меняет существующие таблицы, описывается здесь.
+MIGRATIONS: List[Tuple[str, Migration]] = []
+
+# Ключ advisory lock, чтобы несколько процессов бота не применяли миграции одновременно.
+MIGRATIONS_LOCK_KEY = 0x62616c616e6365
+
+
+def migration(name: str) -> Callable[[Migration], Migration]:
+
+    def register(func: Migration) -> Migration:
+        MIGRATIONS.append((name, func))
+        return func
+
+    return register
+
+
+def metadata_indexes() -> Dict[str, Index]:
+    return {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+
+
+async def create_indexes(con: AsyncConnection, *names: str) -> None:
+    """ Создает индексы, объявленные в моделях, если их еще нет. """
+
+    indexes = metadata_indexes()
+
+    for name in names:
+        await con.run_sync(lambda sync_con, index=indexes[name]: index.create(sync_con, checkfirst=True))
+
+
+@migration('0001_catalog_filter_indexes')
+async def catalog_filter_indexes(con: AsyncConnection) -> None:
+    await create_indexes(
+        con,
+        'idx_item_meta_size',
+        'idx_item_meta_color',
+        'idx_item_meta_sex',
+        'idx_items_brand_id',
+        'idx_items_images_image_id',
+    )
+
+
+def populate_item_variants() -> Insert:
+    """ Варианты из массивов ItemMeta: каждый размер с каждым цветом товара.
+
+    Учета остатков раньше не было, поэтому доступный товар получает остаток 1, недоступный - 0.
+    """
+
+    variants = select(
+        ItemMeta.item_id,
+        Sizes.id,
+        Colors.id,
+        ItemMeta.sex,
+        case((Items.available.is_(False), 0), else_=1),
+    ).select_from(ItemMeta).join(
+        Items, Items.id == ItemMeta.item_id,
+    ).join(
+        Sizes, Sizes.title == any_(ItemMeta.size),
+    ).join(
+        Colors, Colors.title == any_(ItemMeta.color),
+    )
+
+    return insert(ItemVariants).from_select(
+        ['item_id', 'size_id', 'color_id', 'sex', 'stock'], variants,
+    ).on_conflict_do_nothing(
+        index_elements=['item_id', 'size_id', 'color_id', 'sex'],
+    )
+
+
+@migration('0002_item_variants')
+async def item_variants(con: AsyncConnection) -> None:
+    await create_indexes(con, 'idx_item_variants_filters')
+    await con.execute(populate_item_variants())
+
+
+def catalog_search_ddl(
+        schema: str = 'commerce',
+        image_path: str = 'coalesce(im.derivative_path, im.path)',
+        image_events: str = 'UPDATE OF path, derivative_path',
+) -> List[str]:
+    """ Функции и триггеры, которые поддерживают витрину catalog_search в актуальном состоянии.
+
+    Ключ фильтра варианта: size_id * 2^40 + color_id * 2^20 + sex_id, 0 вместо id означает «любой».
+    Формула совпадает с handlers.utils.catalog.catalog_filter_key.
+
+    image_path - выражение пути изображения карточки, image_events - события images, по которым обновляется витрина.
+    Миграции передают их явно, чтобы их DDL не менялся: ранние миграции выполняются до появления
+    images.derivative_path и не должны на него ссылаться.
+    """
+
+    return [
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.catalog_filter_key(size_id bigint, color_id bigint, sex_id bigint)
+RETURNS bigint LANGUAGE sql IMMUTABLE AS $$
+    SELECT size_id * 1099511627776 + color_id * 1048576 + sex_id
+$$
+""",
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.refresh_catalog_search(target_item_id integer)
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM {schema}.catalog_search WHERE item_id = target_item_id;
+
+    INSERT INTO {schema}.catalog_search
+        (item_id, title, description, price, brand_id, brand_title, image_path, variant_keys)
+    SELECT * FROM (
+        SELECT
+            i.id,
+            i.title,
+            i.description,
+            i.price,
+            i.brand_id,
+            b.title,
+            (
+                SELECT {image_path}
+                FROM {schema}.items_images ii
+                JOIN {schema}.images im ON im.id = ii.image_id
+                WHERE ii.item_id = i.id
+                ORDER BY ii.image_id IS DISTINCT FROM i.primary_image_id, ii.image_id
+                LIMIT 1
+            ) AS image_path,
+            ARRAY(
+                SELECT DISTINCT {schema}.catalog_filter_key(size_key, color_key, sex_key)
+                FROM {schema}.item_variants v
+                LEFT JOIN {schema}.sexes s ON s.title = v.sex
+                CROSS JOIN LATERAL unnest(ARRAY[v.size_id, 0]) AS size_key
+                CROSS JOIN LATERAL unnest(ARRAY[v.color_id, 0]) AS color_key
+                CROSS JOIN LATERAL unnest(ARRAY[coalesce(s.id, 0), 0]) AS sex_key
+                WHERE v.item_id = i.id AND v.stock > 0
+            ) AS variant_keys
+        FROM {schema}.items i
+        LEFT JOIN {schema}.brands b ON b.id = i.brand_id
+        WHERE i.id = target_item_id AND i.available IS NOT FALSE
+    ) AS item
+    WHERE item.image_path IS NOT NULL AND cardinality(item.variant_keys) > 0;
+END
+$$
+""",
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.catalog_search_item_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM {schema}.refresh_catalog_search((to_jsonb(OLD) ->> TG_ARGV[0])::integer);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM {schema}.refresh_catalog_search((to_jsonb(NEW) ->> TG_ARGV[0])::integer);
+    END IF;
+    RETURN NULL;
+END
+$$
+""",
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.catalog_search_brand_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM {schema}.refresh_catalog_search(id) FROM {schema}.items WHERE brand_id = NEW.id;
+    RETURN NULL;
+END
+$$
+""",
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.catalog_search_image_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM {schema}.refresh_catalog_search(item_id) FROM {schema}.items_images WHERE image_id = NEW.id;
+    RETURN NULL;
+END
+$$
+""",
+        *catalog_search_trigger(schema, 'items', 'INSERT OR UPDATE OR DELETE', 'catalog_search_item_trigger', 'id'),
+        *catalog_search_trigger(schema, 'item_variants', 'INSERT OR UPDATE OR DELETE', 'catalog_search_item_trigger', 'item_id'),
+        *catalog_search_trigger(schema, 'items_images', 'INSERT OR UPDATE OR DELETE', 'catalog_search_item_trigger', 'item_id'),
+        *catalog_search_trigger(schema, 'images', image_events, 'catalog_search_image_trigger'),
+        *catalog_search_trigger(schema, 'brands', 'UPDATE', 'catalog_search_brand_trigger'),
+    ]
+
+
+def catalog_search_trigger(schema: str, table: str, events: str, function: str, *args: str) -> List[str]:
+
+    trigger = f'{table}_catalog_search'
+    arguments = ', '.join(f"'{arg}'" for arg in args)
+
+    return [
+        f'DROP TRIGGER IF EXISTS {trigger} ON {schema}.{table}',
+        f'CREATE TRIGGER {trigger} AFTER {events} ON {schema}.{table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {schema}.{function}({arguments})',
+    ]
+
+
+def backfill_catalog_search(schema: str = 'commerce') -> str:
+    return f'SELECT {schema}.refresh_catalog_search(id) FROM {schema}.items'
+
+
+@migration('0003_catalog_search')
+async def catalog_search(con: AsyncConnection) -> None:
+    await create_indexes(con, 'idx_catalog_search_variant_keys', 'idx_catalog_search_brand_id')
+
+    for statement in catalog_search_ddl(image_path='im.path', image_events='UPDATE'):
+        await con.execute(text(statement))
+
+    # Витрина заполняется в 0004_items_primary_image: функция обновления читает items.primary_image_id.
+
+
+@migration('0004_items_primary_image')
+async def items_primary_image(con: AsyncConnection) -> None:
+    await con.execute(text(
+        'ALTER TABLE commerce.items ADD COLUMN IF NOT EXISTS primary_image_id INTEGER '
+        'REFERENCES commerce.images (id) ON DELETE SET NULL'
+    ))
+    await con.execute(text(
+        'UPDATE commerce.items SET primary_image_id = ('
+        'SELECT min(image_id) FROM commerce.items_images WHERE item_id = items.id'
+        ') WHERE primary_image_id IS NULL'
+    ))
+
+    for statement in catalog_search_ddl(image_path='im.path', image_events='UPDATE'):
+        await con.execute(text(statement))
+
+    await con.execute(text(backfill_catalog_search()))
+
+
+def catalog_version_ddl(schema: str = 'commerce') -> List[str]:
+    """ Счетчик изменений витрины: процессы бота сверяют его, чтобы перестроить битовый индекс каталога. """
+
+    return [
+        f'INSERT INTO {schema}.catalog_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING',
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.bump_catalog_version()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE {schema}.catalog_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END
+$$
+""",
+        f'DROP TRIGGER IF EXISTS catalog_search_version ON {schema}.catalog_search',
+        f'CREATE TRIGGER catalog_search_version AFTER INSERT OR UPDATE OR DELETE ON {schema}.catalog_search '
+        f'FOR EACH STATEMENT EXECUTE FUNCTION {schema}.bump_catalog_version()',
+    ]
+
+
+@migration('0005_catalog_version')
+async def catalog_version(con: AsyncConnection) -> None:
+    for statement in catalog_version_ddl():
+        await con.execute(text(statement))
+
+
+@migration('0006_filter_dictionaries_version')
+async def filter_dictionaries_version(con: AsyncConnection) -> None:
+    # Справочники фильтров кешируются в процессах бота и перечитываются при смене версии витрины.
+    for table in ('brands', 'colors', 'sizes', 'sexes'):
+        await con.execute(text(f'DROP TRIGGER IF EXISTS {table}_catalog_version ON commerce.{table}'))
+        await con.execute(text(
+            f'CREATE TRIGGER {table}_catalog_version AFTER INSERT OR UPDATE OR DELETE ON commerce.{table} '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION commerce.bump_catalog_version()'
+        ))
+
+
+@migration('0007_images_file_id')
+async def images_file_id(con: AsyncConnection) -> None:
+    await con.execute(text('ALTER TABLE commerce.images ADD COLUMN IF NOT EXISTS file_id VARCHAR(255)'))
+    await con.execute(text('ALTER TABLE commerce.images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)'))
+
+
+@migration('0008_images_derivative_path')
+async def images_derivative_path(con: AsyncConnection) -> None:
+    await con.execute(text('ALTER TABLE commerce.images ADD COLUMN IF NOT EXISTS derivative_path VARCHAR(255)'))
+
+    for statement in catalog_search_ddl(image_path='coalesce(im.derivative_path, im.path)', image_events='UPDATE'):
+        await con.execute(text(statement))
+
+    await con.execute(text(backfill_catalog_search()))
+
+
+@migration('0009_images_catalog_search_columns')
+async def images_catalog_search_columns(con: AsyncConnection) -> None:
+    # file_id и content_hash не попадают в витрину: их запись не должна менять версию каталога.
+    events = 'UPDATE OF path, derivative_path'
+
+    for statement in catalog_search_trigger('commerce', 'images', events, 'catalog_search_image_trigger'):
+        await con.execute(text(statement))
+
+
+def item_variants_ddl(schema: str = 'commerce') -> List[str]:
+    """ Триггер, который поддерживает item_variants по item_meta так же, как их заполнила миграция 0002.
+
+    Варианты, которые остались в item_meta, сохраняют свой остаток, новые получают остаток по Items.available.
+    """
+
+    return [
+        f"""
+CREATE OR REPLACE FUNCTION {schema}.item_meta_variants_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM {schema}.item_variants WHERE item_id = OLD.item_id;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM {schema}.item_variants v
+        WHERE v.item_id = OLD.item_id AND (
+            v.item_id <> NEW.item_id
+            OR v.sex IS DISTINCT FROM NEW.sex
+            OR NOT EXISTS (
+                SELECT 1 FROM {schema}.sizes s, {schema}.colors c
+                WHERE s.id = v.size_id AND c.id = v.color_id
+                  AND s.title = ANY(NEW.size) AND c.title = ANY(NEW.color)
+            )
+        );
+    END IF;
+
+    INSERT INTO {schema}.item_variants (item_id, size_id, color_id, sex, stock)
+    SELECT NEW.item_id, s.id, c.id, NEW.sex, CASE WHEN i.available IS FALSE THEN 0 ELSE 1 END
+    FROM {schema}.items i, {schema}.sizes s, {schema}.colors c
+    WHERE i.id = NEW.item_id AND s.title = ANY(NEW.size) AND c.title = ANY(NEW.color)
+    ON CONFLICT (item_id, size_id, color_id, sex) DO NOTHING;
+
+    RETURN NULL;
+END
+$$
+""",
+        f'DROP TRIGGER IF EXISTS item_meta_variants ON {schema}.item_meta',
+        f'CREATE TRIGGER item_meta_variants AFTER INSERT OR UPDATE OR DELETE ON {schema}.item_meta '
+        f'FOR EACH ROW EXECUTE FUNCTION {schema}.item_meta_variants_trigger()',
+    ]
+
+
+@migration('0010_item_meta_variants')
+async def item_meta_variants(con: AsyncConnection) -> None:
+    for statement in item_variants_ddl():
+        await con.execute(text(statement))
+
+    # Товары, добавленные после 0002_item_variants, получают варианты сейчас.
+    await con.execute(populate_item_variants())
+
+
+async def apply_migrations(engine: AsyncEngine) -> List[str]:
+    """ Применяет новые миграции в одной транзакции. Возвращает имена примененных миграций. """
+
+    applied_now = []
+
+    async with engine.begin() as con:
+        await con.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATIONS_LOCK_KEY})
+        await con.execute(text(
+            'CREATE TABLE IF NOT EXISTS public.schema_migrations ('
+            'name VARCHAR(255) PRIMARY KEY, '
+            'applied_at TIMESTAMP NOT NULL DEFAULT now())'
+        ))
+
+        applied = set((await con.execute(text('SELECT name FROM public.schema_migrations'))).scalars())
+
+        for name, func in MIGRATIONS:
+            if name in applied:
+                continue
+
+            await func(con)
+            await con.execute(text('INSERT INTO public.schema_migrations (name) VALUES (:name)'), {'name': name})
+
+            logging.getLogger(__name__).info('Migration applied: %s', name)
+            applied_now.append(name)
+
+    return applied_now
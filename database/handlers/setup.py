@@ -7,6 +7,7 @@ from sqlalchemy.sql.ddl import CreateSchema
 from database.models import *
 from database.engine import postgres_engine
 from database.handlers.utils.session import PostgresAsyncSession
+from database.handlers.migrations import apply_migrations
 
 
 async def setup_database():
@@ -29,3 +30,8 @@ async def setup_database():
     except sqlalchemy.exc.ProgrammingError as prog_err:
         logging.getLogger(__name__).error(str(prog_err))
 
+    try:
+        await apply_migrations(postgres_engine.engine)
+    except sqlalchemy.exc.SQLAlchemyError as sql_err:
+        logging.getLogger(__name__).error(str(sql_err))
+
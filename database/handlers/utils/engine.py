@@ -1,7 +1,5 @@
-from sqlalchemy.ext.asyncio import create_async_engine
-from database.conf import environments_settings
+from database.engine import postgres_engine
 
 
-engine = create_async_engine(
-    url=environments_settings._load_env_vars().get('POSTGRES_URL'),
-)
+# Общий пул соединений: отдельный движок для PostgresAsyncSession больше не создается.
+engine = postgres_engine.engine
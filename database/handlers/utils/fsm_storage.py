@@ -0,0 +1,175 @@
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple, cast
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, KeyBuilder
+from aioredis import Redis
+
+from serializers.serializers import Codec, JsonCodec
+
+
+class RedisHashStorage(BaseStorage):
+    """ Хранилище FSM, в котором каждый ключ данных лежит в отдельном поле хэша Redis.
+
+    Частичное обновление пишет только изменившиеся поля.
+    Данные читаются целиком: FSMUnitOfWorkMiddleware загружает их одним пайплайном вместе с состоянием до обработки апдейта.
+    Небольшие хэши Redis хранит в компактной кодировке (listpack), поэтому данные пользователя занимают меньше памяти.
+
+    Значения полей кодируются подключаемым кодеком (см. serializers.serializers), по умолчанию JSON.
+
+    Данные, записанные прежним RedisStorage одной JSON-строкой, переносятся в хэш при первом чтении.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            key_builder: Optional[KeyBuilder] = None,
+            state_ttl: Optional[int] = None,
+            data_ttl: Optional[int] = None,
+            codec: Optional[Codec] = None,
+    ) -> None:
+
+        self.redis = redis
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.state_ttl = state_ttl
+        self.data_ttl = data_ttl
+        self.codec = codec or JsonCodec()
+
+    def _state_key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key, 'state')
+
+    def _data_key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key, 'fields')
+
+    def _legacy_data_key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key, 'data')
+
+    def _decode_fields(self, fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+        return {
+            field.decode('utf-8'): self.codec.loads(value)
+            for field, value in fields.items()
+        }
+
+    def _encode_fields(self, data: Dict[str, Any]) -> Dict[str, bytes]:
+        return {field: self.codec.dumps(value) for field, value in data.items()}
+
+    async def _merge_legacy_data(self, key: StorageKey, data: Dict[str, Any], legacy_data: Optional[bytes]) -> Dict[str, Any]:
+
+        if legacy_data is None:
+            return data
+
+        data = {**json.loads(legacy_data), **data}
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if data:
+                pipe.hset(self._data_key(key), mapping=self._encode_fields(data))
+                if self.data_ttl:
+                    pipe.expire(self._data_key(key), self.data_ttl)
+            pipe.delete(self._legacy_data_key(key))
+            await pipe.execute()
+
+        return data
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+
+        if state is None:
+            await self.redis.delete(self._state_key(key))
+        else:
+            await self.redis.set(
+                self._state_key(key),
+                cast(str, state.state if isinstance(state, State) else state),
+                ex=self.state_ttl,
+            )
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+
+        value = await self.redis.get(self._state_key(key))
+
+        if isinstance(value, bytes):
+            return value.decode('utf-8')
+
+        return cast(Optional[str], value)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._data_key(key), self._legacy_data_key(key))
+
+            if data:
+                pipe.hset(self._data_key(key), mapping=self._encode_fields(data))
+                if self.data_ttl:
+                    pipe.expire(self._data_key(key), self.data_ttl)
+
+            await pipe.execute()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._data_key(key))
+            pipe.get(self._legacy_data_key(key))
+            fields, legacy_data = await pipe.execute()
+
+        return await self._merge_legacy_data(key, self._decode_fields(fields), legacy_data)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+
+        if not data:
+            return await self.get_data(key)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._data_key(key), mapping=self._encode_fields(data))
+            if self.data_ttl:
+                pipe.expire(self._data_key(key), self.data_ttl)
+            pipe.hgetall(self._data_key(key))
+            pipe.get(self._legacy_data_key(key))
+            *_, fields, legacy_data = await pipe.execute()
+
+        return await self._merge_legacy_data(key, self._decode_fields(fields), legacy_data)
+
+    async def get_record(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self._state_key(key))
+            pipe.hgetall(self._data_key(key))
+            pipe.get(self._legacy_data_key(key))
+            state, fields, legacy_data = await pipe.execute()
+
+        if isinstance(state, bytes):
+            state = state.decode('utf-8')
+
+        return state, await self._merge_legacy_data(key, self._decode_fields(fields), legacy_data)
+
+    async def set_record(
+            self,
+            key: StorageKey,
+            state: Optional[str],
+            changed: Dict[str, Any],
+            removed: Iterable[str] = (),
+            write_state: bool = True,
+    ) -> None:
+        """ Записывает состояние и только изменившиеся/удаленные ключи данных одним пайплайном. """
+
+        removed = list(removed)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+
+            if write_state:
+                if state is None:
+                    pipe.delete(self._state_key(key))
+                else:
+                    pipe.set(self._state_key(key), state, ex=self.state_ttl)
+
+            if removed:
+                pipe.hdel(self._data_key(key), *removed)
+
+            if changed:
+                pipe.hset(self._data_key(key), mapping=self._encode_fields(changed))
+                if self.data_ttl:
+                    pipe.expire(self._data_key(key), self.data_ttl)
+
+            await pipe.execute()
+
+    async def close(self) -> None:
+        # Клиент общий для всего бота и закрывается в on_shutdown (app.py), хранилище им не владеет.
+        pass
@@ -0,0 +1,86 @@
+import uuid
+from typing import Iterable, List
+
+from aioredis import Redis
+
+from utils.bloom_filter import BloomFilter
+
+
+class RedisBloomFilter:
+    """ Фильтр Блума, биты которого лежат в строке Redis и общие для всех процессов бота.
+
+    Параметры фильтра входят в имя ключа, поэтому процессы с разными настройками не портят биты друг друга.
+    """
+
+    # Добавление пишет и в основной ключ, и в ключи всех идущих перестроек (их имена лежат в множестве KEYS[2]),
+    # чтобы ни одна перестройка его не потеряла. Ключи перестроек, которые истекли, не завершившись, забываются.
+    ADD_LUA = """
+local rebuilds = redis.call('SMEMBERS', KEYS[2])
+for i = 1, #ARGV do
+    redis.call('SETBIT', KEYS[1], ARGV[i], 1)
+end
+for _, rebuild_key in ipairs(rebuilds) do
+    if redis.call('EXISTS', rebuild_key) == 1 then
+        for i = 1, #ARGV do
+            redis.call('SETBIT', rebuild_key, ARGV[i], 1)
+        end
+    else
+        redis.call('SREM', KEYS[2], rebuild_key)
+    end
+end
+return 1
+"""
+
+    # Сколько живет ключ перестройки, если процесс упал, не завершив ее.
+    REBUILD_TTL = 24 * 3600
+
+    def __init__(self, name: str, capacity: int, error_rate: float) -> None:
+        self._params = BloomFilter(capacity, error_rate)
+
+        self.key = f'bloom:{name}:{self._params.size}:{self._params.hashes}'
+        self.rebuilds_key = f'{self.key}:rebuilds'
+
+    def positions(self, value: int) -> List[int]:
+        return self._params.positions(value)
+
+    async def add(self, r_cli: Redis, value: int) -> None:
+        await r_cli.eval(self.ADD_LUA, 2, self.key, self.rebuilds_key, *self.positions(value))
+
+    async def begin_rebuild(self, r_cli: Redis) -> str:
+        """ Начинает перестройку: с этого момента add пишет и в ее ключ. Возвращает ключ перестройки.
+
+        Вызывается до чтения значений из базы, иначе значение, добавленное между чтением и началом
+        перестройки, попадет только в старый ключ и пропадет при подмене.
+        У каждой перестройки свой ключ, поэтому перестройки нескольких процессов, запущенных одновременно,
+        не забирают друг у друга добавленные значения.
+        """
+
+        rebuild_key = f'{self.key}:rebuild:{uuid.uuid4().hex}'
+
+        async with r_cli.pipeline(transaction=True) as pipe:
+            pipe.set(rebuild_key, b'', ex=self.REBUILD_TTL)
+            pipe.sadd(self.rebuilds_key, rebuild_key)
+            await pipe.execute()
+
+        return rebuild_key
+
+    async def finish_rebuild(self, r_cli: Redis, rebuild_key: str, values: Iterable[int]) -> int:
+        """ Собирает фильтр из values и атомарно подменяет им текущий. Возвращает число значений. """
+
+        bloom_filter = BloomFilter(self._params.capacity, self._params.error_rate)
+
+        count = 0
+        for value in values:
+            bloom_filter.add(value)
+            count += 1
+
+        async with r_cli.pipeline(transaction=True) as pipe:
+            pipe.set(f'{rebuild_key}:bits', bloom_filter.to_bytes())
+            pipe.bitop('OR', rebuild_key, rebuild_key, f'{rebuild_key}:bits')
+            pipe.delete(f'{rebuild_key}:bits')
+            pipe.srem(self.rebuilds_key, rebuild_key)
+            pipe.persist(rebuild_key)
+            pipe.rename(rebuild_key, self.key)
+            await pipe.execute()
+
+        return count
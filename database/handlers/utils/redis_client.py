@@ -1,10 +1,24 @@
 import aioredis
 
-from database.conf import environments_settings
+from database.conf import REDIS_URL, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT
 
 
-async def connect_redis_url():
+async def connect_redis_url(
+        max_connections: int = REDIS_MAX_CONNECTIONS,
+        timeout: float = REDIS_POOL_TIMEOUT,
+) -> aioredis.Redis:
+    """ Создает клиент поверх собственного пула соединений.
 
-    url = environments_settings._load_env_vars().get('REDIS_URL')
-    return await aioredis.from_url(url)
+    Вызывается один раз при старте процесса, дальше клиент передается через workflow data диспетчера.
+    Когда заняты все max_connections, запрос ждет свободное соединение до timeout секунд,
+    а не получает ConnectionError сразу, как с обычным ConnectionPool.
+    """
 
+    pool = aioredis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=max_connections, timeout=timeout)
+    return aioredis.Redis(connection_pool=pool)
+
+
+async def close_redis(redis: aioredis.Redis) -> None:
+
+    await redis.close()
+    await redis.connection_pool.disconnect()
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import os
+from typing import List, Sequence, Union
+
+from aiogram.types import FSInputFile, Message
+from aioredis import Redis
+from sqlalchemy import select, update
+
+from database.models import Images
+from database.session import AsyncSessionLocal
+from middlewares.settings import FILE_DIGESTS_MAX_ENTRIES, FILE_DIGESTS_IDLE_TTL
+from utils.bounded_store import BoundedStore
+
+
+def file_digest(path: str) -> str:
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class TelegramFileCache:
+    """ file_id изображений, уже загруженных в Telegram, чтобы не отправлять одни и те же байты повторно.
+
+    file_id привязан к sha256 содержимого файла: Redis хранит хеш «sha256 -> file_id», общий для процессов,
+    а Images.file_id и Images.content_hash переживают очистку Redis.
+    Если файл по тому же пути заменили, у него другой хеш, и изображение загружается заново.
+    """
+
+    def __init__(self, key: str, max_digests: int, digests_idle_ttl: float) -> None:
+        self.key = key
+
+        # path -> (mtime, размер, sha256): файл перечитывается, только если он изменился на диске.
+        # Путей столько же, сколько изображений в каталоге, поэтому давно не показанные вытесняются.
+        self.digests = BoundedStore(max_weight=max_digests, idle_ttl=digests_idle_ttl)
+
+    async def digest(self, path: str) -> str:
+
+        stat = os.stat(path)
+        cached = self.digests.get(path)
+
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        digest = await asyncio.to_thread(file_digest, path)
+        self.digests.set(path, (stat.st_mtime_ns, stat.st_size, digest))
+
+        return digest
+
+    async def photo(self, r_cli: Redis, path: str) -> Union[str, FSInputFile]:
+        """ file_id изображения, если оно уже загружено, иначе файл для загрузки. """
+
+        digest = await self.digest(path)
+
+        file_id = await r_cli.hget(self.key, digest)
+
+        if file_id is None:
+            async with AsyncSessionLocal() as session:
+                async with session.begin():
+                    file_id = await session.scalar(
+                        select(Images.file_id).where(
+                            Images.display_path == path, Images.content_hash == digest, Images.file_id.is_not(None),
+                        ).limit(1)
+                    )
+
+            if file_id is not None:
+                await r_cli.hset(self.key, digest, file_id)
+
+        if file_id is None:
+            return FSInputFile(path)
+
+        return file_id.decode() if isinstance(file_id, bytes) else file_id
+
+    async def remember(self, r_cli: Redis, path: str, message: Message) -> None:
+        """ Запоминает file_id, который Telegram выдал при загрузке изображения path. """
+
+        if not message.photo:
+            return
+
+        digest = await self.digest(path)
+        file_id = message.photo[-1].file_id
+
+        await r_cli.hset(self.key, digest, file_id)
+
+        async with AsyncSessionLocal() as session:
+            async with session.begin():
+                await session.execute(
+                    update(Images).where(Images.display_path == path).values(file_id=file_id, content_hash=digest)
+                )
+
+    async def remember_all(
+            self,
+            r_cli: Redis,
+            paths: Sequence[str],
+            photos: Sequence[Union[str, FSInputFile]],
+            messages: List[Message],
+    ) -> None:
+        """ remember для альбома: запоминаются только изображения, которые действительно загружались. """
+
+        for path, photo, message in zip(paths, photos, messages):
+            if isinstance(photo, FSInputFile):
+                await self.remember(r_cli, path, message)
+
+
+telegram_files = TelegramFileCache('telegram_file_ids', FILE_DIGESTS_MAX_ENTRIES, FILE_DIGESTS_IDLE_TTL)
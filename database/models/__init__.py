@@ -9,6 +9,9 @@ __all__ = [
     'Items',
     'Images',
     'ItemMeta',
+    'ItemVariants',
+    'CatalogSearch',
+    'CatalogVersion',
     'Brands',
     'OrderItem',
     'Orders',
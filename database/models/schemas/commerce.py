@@ -1,9 +1,11 @@
 import enum
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, Boolean, ForeignKey, Index, DateTime, Enum
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Text, DECIMAL, Boolean, ForeignKey, Index, DateTime, Enum, UniqueConstraint, func,
+)
 from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property
 
 from .base import Base
 from database.conf import DEBUG
@@ -20,6 +22,10 @@ class ItemsImages(Base):
     image_id = Column(Integer, ForeignKey('commerce.images.id'), primary_key=True)
 
 
+# item_id покрыт первичным ключом (item_id, image_id).
+Index('idx_items_images_image_id', ItemsImages.image_id)
+
+
 class Items(Base):
 
     __tablename__ = 'items'
@@ -33,6 +39,8 @@ class Items(Base):
     price = Column(DECIMAL, nullable=False)
     available = Column(Boolean, default=True)
     brand_id = Column(Integer, ForeignKey('commerce.brands.id'))
+    # Главное изображение для карточки и каталога. Если не задано, берется изображение с наименьшим id.
+    primary_image_id = Column(Integer, ForeignKey('commerce.images.id', ondelete='SET NULL'), nullable=True)
 
     images = relationship('Images', secondary='commerce.items_images', back_populates='items')
     item_meta = relationship('ItemMeta', back_populates='items')
@@ -40,6 +48,7 @@ class Items(Base):
 
 
 Index('idx_items_id', Items.id)
+Index('idx_items_brand_id', Items.brand_id)
 
 
 class Images(Base):
@@ -51,6 +60,12 @@ class Images(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     path = Column(String(255), nullable=False)
+    # Оптимизированная копия для Telegram (apps.images.derivatives). Покупателям отправляется display_path.
+    derivative_path = Column(String(255), nullable=True)
+    display_path = column_property(func.coalesce(derivative_path, path))
+    # file_id загруженного в Telegram изображения и sha256 файла, для которого он получен.
+    file_id = Column(String(255), nullable=True)
+    content_hash = Column(String(64), nullable=True)
 
     items = relationship('Items', secondary='commerce.items_images', back_populates='images')
 
@@ -77,6 +92,11 @@ class ItemMeta(Base):
     items = relationship('Items', back_populates='item_meta', uselist=False, single_parent=True)
 
 
+Index('idx_item_meta_size', ItemMeta.size, postgresql_using='gin')
+Index('idx_item_meta_color', ItemMeta.color, postgresql_using='gin')
+Index('idx_item_meta_sex', ItemMeta.sex)
+
+
 class Brands(Base):
 
     __tablename__ = 'brands'
@@ -130,6 +150,75 @@ class Sex(Base):
     title = Column(Enum(Gender, schema='commerce'))
 
 
+class ItemVariants(Base):
+    """ Вариант товара (размер, цвет, пол) и его остаток.
+
+    Строки поддерживаются по item_meta триггером (см. миграцию 0010).
+    """
+
+    __tablename__ = 'item_variants'
+    __table_args__ = (
+        UniqueConstraint('item_id', 'size_id', 'color_id', 'sex'),
+        {'schema': 'commerce'} if not DEBUG else None,
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    item_id = Column(Integer, ForeignKey('commerce.items.id', ondelete='CASCADE'), nullable=False)
+    size_id = Column(Integer, ForeignKey('commerce.sizes.id'), nullable=False)
+    color_id = Column(Integer, ForeignKey('commerce.colors.id'), nullable=False)
+    sex = Column(Enum(ItemMeta.Gender, schema='commerce'))
+    stock = Column(Integer, nullable=False, default=0)
+
+
+# Фильтры каталога ищут только варианты в наличии.
+Index(
+    'idx_item_variants_filters',
+    ItemVariants.size_id, ItemVariants.color_id, ItemVariants.sex, ItemVariants.item_id,
+    postgresql_where=ItemVariants.stock > 0,
+)
+
+
+class CatalogSearch(Base):
+    """ Витрина каталога: одна строка на товар, который можно показать покупателю.
+
+    Заполняется триггерами из items, brands, images, items_images и item_variants (см. миграцию 0003).
+    variant_keys - ключи фильтров вариантов в наличии, включая ключи с 0 вместо любого из фильтров.
+    """
+
+    __tablename__ = 'catalog_search'
+    __table_args__ = (
+        {'schema': 'commerce'} if not DEBUG else None,
+    )
+
+    item_id = Column(Integer, ForeignKey('commerce.items.id', ondelete='CASCADE'), primary_key=True)
+    title = Column(String(length=255), nullable=False)
+    description = Column(Text, nullable=True)
+    price = Column(DECIMAL, nullable=False)
+    brand_id = Column(Integer)
+    brand_title = Column(String(length=50))
+    image_path = Column(String(255), nullable=False)
+    variant_keys = Column(ARRAY(BigInteger), nullable=False)
+
+
+Index('idx_catalog_search_variant_keys', CatalogSearch.variant_keys, postgresql_using='gin')
+Index('idx_catalog_search_brand_id', CatalogSearch.brand_id, CatalogSearch.item_id)
+
+
+class CatalogVersion(Base):
+    """ Версия каталога: одна строка, растет при изменении витрины catalog_search и справочников фильтров.
+
+    См. миграции 0005 и 0006.
+    """
+
+    __tablename__ = 'catalog_version'
+    __table_args__ = (
+        {'schema': 'commerce'} if not DEBUG else None,
+    )
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
 class OrderItem(Base):
 
     __tablename__ = 'order_item'
@@ -0,0 +1,80 @@
+import time
+from dataclasses import dataclass, asdict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolMetrics:
+    """ Счетчики пула соединений. Время ожидания соединения указывается в секундах. """
+
+    checkouts: int = 0
+    checkout_time_total: float = 0.0
+    checkout_time_max: float = 0.0
+    saturated_checkouts: int = 0
+    timeouts: int = 0
+    in_use: int = 0
+    in_use_max: int = 0
+
+    @property
+    def checkout_time_avg(self) -> float:
+        return self.checkout_time_total / self.checkouts if self.checkouts else 0.0
+
+    def observe_checkout(self, elapsed: float, saturated: bool) -> None:
+        self.checkouts += 1
+        self.checkout_time_total += elapsed
+        self.checkout_time_max = max(self.checkout_time_max, elapsed)
+        self.in_use += 1
+        self.in_use_max = max(self.in_use_max, self.in_use)
+
+        if saturated:
+            self.saturated_checkouts += 1
+
+    def observe_checkin(self) -> None:
+        self.in_use = max(self.in_use - 1, 0)
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), 'checkout_time_avg': self.checkout_time_avg}
+
+
+class MeteredAsyncPool(AsyncAdaptedQueuePool):
+    """ AsyncAdaptedQueuePool, который считает время выдачи соединений и насыщение пула. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+
+        # Пул насыщен, если все постоянные и дополнительные соединения уже выданы.
+        saturated = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+
+        self.metrics.observe_checkout(time.perf_counter() - start, saturated)
+
+        return connection
+
+    def _do_return_conn(self, record):
+        self.metrics.observe_checkin()
+        super()._do_return_conn(record)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def status_dict(self) -> dict:
+        return {
+            'size': self.size(),
+            'checked_in': self.checkedin(),
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            **self.metrics.as_dict(),
+        }
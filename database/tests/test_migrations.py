@@ -0,0 +1,207 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from sqlalchemy import text, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.sql.ddl import CreateSchema
+
+from database.engine import postgres_engine
+from database.handlers.migrations import MIGRATIONS, apply_migrations
+from database.handlers.utils.redis_client import connect_redis_url, close_redis
+from database.handlers.utils.telegram_file_cache import TelegramFileCache
+from database.models import Base, CatalogSearch, CatalogVersion, Images, ItemVariants
+from database.session import AsyncSessionLocal
+
+# Миграции пишут в схему commerce, поэтому тесты работают в отдельной базе на том же сервере.
+TEST_DATABASE = 'balance_bot_migrations_test'
+
+# Схема до миграций: колонки и таблицы, которые добавили миграции 0001 - 0008.
+BASELINE_DDL = (
+    'ALTER TABLE commerce.items DROP COLUMN primary_image_id',
+    'ALTER TABLE commerce.images DROP COLUMN derivative_path',
+    'ALTER TABLE commerce.images DROP COLUMN file_id',
+    'ALTER TABLE commerce.images DROP COLUMN content_hash',
+    'DROP TABLE commerce.catalog_search',
+    'DROP TABLE commerce.catalog_version',
+    'DROP TABLE commerce.item_variants',
+)
+
+CATALOG_SEED = (
+    "INSERT INTO commerce.brands (id, title) VALUES (1, 'brand')",
+    "INSERT INTO commerce.sizes (id, title) VALUES (1, 42)",
+    "INSERT INTO commerce.colors (id, title) VALUES (1, 'черный')",
+    "INSERT INTO commerce.items (id, title, price, available, brand_id) VALUES (1, 'item', 100, true, 1)",
+    "INSERT INTO commerce.images (id, path) VALUES (1, 'media/1.jpg')",
+    "INSERT INTO commerce.items_images (item_id, image_id) VALUES (1, 1)",
+    "INSERT INTO commerce.item_meta (item_id, size, color, sex) VALUES (1, '{42}', '{черный}', 'male')",
+)
+
+
+class MigrationsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+
+        async with postgres_engine.engine.connect() as con:
+            await con.execution_options(isolation_level='AUTOCOMMIT')
+            await con.execute(text(f'DROP DATABASE IF EXISTS {TEST_DATABASE}'))
+            await con.execute(text(f'CREATE DATABASE {TEST_DATABASE}'))
+
+        self.engine = create_async_engine(postgres_engine.engine.url.set(database=TEST_DATABASE))
+
+        async with self.engine.begin() as con:
+            await con.execute(CreateSchema('auth'))
+            await con.execute(CreateSchema('commerce'))
+            await con.run_sync(Base.metadata.create_all)
+
+            for statement in BASELINE_DDL + CATALOG_SEED:
+                await con.execute(text(statement))
+
+    async def asyncTearDown(self):
+
+        await self.engine.dispose()
+
+        async with postgres_engine.engine.connect() as con:
+            await con.execution_options(isolation_level='AUTOCOMMIT')
+            await con.execute(text(f'DROP DATABASE IF EXISTS {TEST_DATABASE}'))
+
+        await postgres_engine.dispose()
+
+
+class TestMigrations(MigrationsTestCase):
+
+    async def test001_migrations_from_baseline(self):
+
+        # Как в setup_database: сначала create_all создает новые таблицы, затем применяются миграции.
+        async with self.engine.begin() as con:
+            await con.run_sync(Base.metadata.create_all)
+
+        applied = await apply_migrations(self.engine)
+
+        self.assertEqual(applied, [name for name, _ in MIGRATIONS])
+
+        async with self.engine.connect() as con:
+            image_path = await con.scalar(select(CatalogSearch.image_path).where(CatalogSearch.item_id == 1))
+            version = await con.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+
+        self.assertEqual(image_path, 'media/1.jpg')
+        self.assertIsNotNone(version)
+
+        self.assertEqual(await apply_migrations(self.engine), [])
+
+
+class TestCatalogVersion(MigrationsTestCase):
+
+    async def asyncSetUp(self):
+
+        await super().asyncSetUp()
+
+        async with self.engine.begin() as con:
+            await con.run_sync(Base.metadata.create_all)
+
+        await apply_migrations(self.engine)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, '1.jpg')
+
+        with open(self.path, 'wb') as file:
+            file.write(b'image')
+
+        async with self.engine.begin() as con:
+            await con.execute(update(Images).where(Images.id == 1).values(path=self.path))
+
+        # TelegramFileCache пишет через общую фабрику сессий, на время теста она смотрит в тестовую базу.
+        AsyncSessionLocal.configure(bind=self.engine)
+
+        self.redis_client = await connect_redis_url()
+        self.files = TelegramFileCache('test_telegram_file_ids', max_digests=10, digests_idle_ttl=60)
+
+    async def asyncTearDown(self):
+
+        AsyncSessionLocal.configure(bind=postgres_engine.engine)
+
+        await self.redis_client.delete(self.files.key)
+        await close_redis(self.redis_client)
+
+        self.directory.cleanup()
+
+        await super().asyncTearDown()
+
+    async def catalog_version(self) -> int:
+
+        async with self.engine.connect() as con:
+            return await con.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+
+    async def test001_remember_keeps_catalog_version(self):
+
+        version = await self.catalog_version()
+        message = SimpleNamespace(photo=[SimpleNamespace(file_id='file-id')])
+
+        await self.files.remember(self.redis_client, self.path, message)
+
+        self.assertEqual(await self.catalog_version(), version)
+        self.assertEqual(await self.files.photo(self.redis_client, self.path), 'file-id')
+
+    async def test002_derivative_path_bumps_catalog_version(self):
+
+        version = await self.catalog_version()
+
+        async with self.engine.begin() as con:
+            await con.execute(update(Images).where(Images.id == 1).values(derivative_path='media/derivatives/1.jpg'))
+
+        self.assertGreater(await self.catalog_version(), version)
+
+
+
+class TestItemVariants(MigrationsTestCase):
+
+    async def asyncSetUp(self):
+
+        await super().asyncSetUp()
+
+        async with self.engine.begin() as con:
+            await con.run_sync(Base.metadata.create_all)
+
+        await apply_migrations(self.engine)
+
+    async def test001_new_item_meta_reaches_catalog(self):
+
+        async with self.engine.begin() as con:
+            for statement in (
+                "INSERT INTO commerce.colors (id, title) VALUES (2, 'белый')",
+                "INSERT INTO commerce.items (id, title, price, available, brand_id) VALUES (2, 'new', 100, true, 1)",
+                "INSERT INTO commerce.images (id, path) VALUES (2, 'media/2.jpg')",
+                "INSERT INTO commerce.items_images (item_id, image_id) VALUES (2, 2)",
+                "INSERT INTO commerce.item_meta (item_id, size, color, sex) VALUES (2, '{42}', '{черный,белый}', 'male')",
+            ):
+                await con.execute(text(statement))
+
+        async with self.engine.connect() as con:
+            colors = (await con.scalars(select(ItemVariants.color_id).where(ItemVariants.item_id == 2))).all()
+            in_catalog = await con.scalar(select(CatalogSearch.item_id).where(CatalogSearch.item_id == 2))
+
+        self.assertEqual(sorted(colors), [1, 2])
+        self.assertEqual(in_catalog, 2)
+
+        async with self.engine.begin() as con:
+            await con.execute(text("UPDATE commerce.item_meta SET color = '{белый}' WHERE item_id = 2"))
+
+        async with self.engine.connect() as con:
+            colors = (await con.scalars(select(ItemVariants.color_id).where(ItemVariants.item_id == 2))).all()
+
+        self.assertEqual(colors, [2])
+
+        async with self.engine.begin() as con:
+            await con.execute(text('DELETE FROM commerce.item_meta WHERE item_id = 2'))
+
+        async with self.engine.connect() as con:
+            in_catalog = await con.scalar(select(CatalogSearch.item_id).where(CatalogSearch.item_id == 2))
+
+        self.assertIsNone(in_catalog)
+
+
+if __name__ == '__main__':
+    for test_case in (TestMigrations, TestCatalogVersion, TestItemVariants):
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(failfast=False).run(suite)
@@ -0,0 +1,57 @@
+import unittest
+
+from database.handlers.utils.redis_bloom_filter import RedisBloomFilter
+from database.handlers.utils.redis_client import connect_redis_url, close_redis
+
+
+class TestRedisBloomFilter(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+
+        self.redis_client = await connect_redis_url()
+        self.bloom_filter = RedisBloomFilter('test_registered_users', capacity=1000, error_rate=0.01)
+
+    async def asyncTearDown(self):
+
+        await self.redis_client.delete(self.bloom_filter.key, self.bloom_filter.rebuilds_key)
+        await close_redis(self.redis_client)
+
+    async def contains(self, value: int) -> bool:
+
+        bits = [await self.redis_client.getbit(self.bloom_filter.key, position) for position in self.bloom_filter.positions(value)]
+
+        return all(bits)
+
+    async def test001_add_during_rebuild_is_kept(self):
+
+        await self.bloom_filter.add(self.redis_client, 1)
+
+        rebuild_key = await self.bloom_filter.begin_rebuild(self.redis_client)
+        # Пользователь зарегистрировался после начала перестройки, но его нет в прочитанных из базы значениях.
+        await self.bloom_filter.add(self.redis_client, 2)
+        count = await self.bloom_filter.finish_rebuild(self.redis_client, rebuild_key, [1, 3])
+
+        self.assertEqual(count, 2)
+        self.assertTrue(await self.contains(1))
+        self.assertTrue(await self.contains(2))
+        self.assertTrue(await self.contains(3))
+        self.assertFalse(await self.redis_client.exists(rebuild_key))
+        self.assertFalse(await self.redis_client.exists(self.bloom_filter.rebuilds_key))
+
+    async def test002_concurrent_rebuilds_keep_added_values(self):
+
+        first_key = await self.bloom_filter.begin_rebuild(self.redis_client)
+        second_key = await self.bloom_filter.begin_rebuild(self.redis_client)
+
+        await self.bloom_filter.finish_rebuild(self.redis_client, first_key, [1])
+        # Добавлено после подмены первой перестройкой, но до подмены второй.
+        await self.bloom_filter.add(self.redis_client, 2)
+        await self.bloom_filter.finish_rebuild(self.redis_client, second_key, [1])
+
+        self.assertTrue(await self.contains(1))
+        self.assertTrue(await self.contains(2))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRedisBloomFilter)
+    unittest.TextTestRunner(failfast=False).run(suite)
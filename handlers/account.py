@@ -1,8 +1,9 @@
 import re
-from typing import Awaitable
+from typing import Awaitable, Tuple
 
 import sqlalchemy.exc
 from aiogram.fsm.context import FSMContext
+from aioredis import Redis
 
 from sqlalchemy import select, or_, and_
 from sqlalchemy.sql.functions import count, func, coalesce
@@ -18,10 +19,9 @@ from keyboards.inline.auth import get_registration_keyboard
 from states.states import SetNewAddressState
 from database.session import AsyncSessionLocal
 from handlers.utils.named_entities import Item, AddressItem
-from handlers.utils.auxillary import paginate, delete_prev_messages_and_update_state
+from handlers.utils.auxillary import show_item, replace_card, delete_prev_messages_and_update_state
+from handlers.utils.order_history import order_history_step
 from utils.jinja_template import render_template
-from utils.paginator import Paginator
-from mem_storage import paginator_storage
 
 router = Router()
 
@@ -93,7 +93,7 @@ async def personal_account_handler(query: CallbackQuery, state: FSMContext):
     F.data == 'orders',
 )
 @delete_prev_messages_and_update_state
-async def all_orders_handler(query: CallbackQuery, state: FSMContext):
+async def all_orders_handler(query: CallbackQuery, state: FSMContext, redis: Redis):
     data = await state.get_data()
 
     tg_id = query.message.chat.id
@@ -106,40 +106,7 @@ async def all_orders_handler(query: CallbackQuery, state: FSMContext):
             reply_markup=await main_menu_markup(),
         )
     try:
-        async with AsyncSessionLocal() as session:
-            async with session.begin():
-                stmt_result = await session.execute(
-                    select(
-                        Items.id,
-                        Items.title,
-                        Items.description,
-                        Items.price,
-                        Brands.title,
-                        Images.path,
-                    ).select_from(Orders)
-                    .join(OrderItem)
-                    .join(Items)
-                    .join(ItemMeta)
-                    .join(Brands)
-                    .join(ItemsImages)
-                    .join(Images)
-                    .filter(Orders.user_id == user_id, Orders.paid.is_(True))
-                )
-
-                data = stmt_result.fetchmany(100)
-
-                paginator = Paginator(data)
-
-                async with paginator_storage:
-                    paginator_storage[tg_id] = paginator
-
-                if data:
-                    return await paginate_over_bought_items(query, state)
-                else:
-                    return await query.message.answer(
-                        text='У вас пока что нет покупок в нашем магазине.',
-                        reply_markup=await personal_account_markup()
-                    )
+        step = await order_history_step(tg_id, PersonalOrdersCallbackData())
     except sqlalchemy.exc.SQLAlchemyError:
         html = await render_template(template_name='errors/common.html')
         return await query.message.answer(
@@ -147,29 +114,59 @@ async def all_orders_handler(query: CallbackQuery, state: FSMContext):
             reply_markup=await main_menu_markup(),
         )
 
+    if step is None:
+        return await query.message.answer(
+            text='У вас пока что нет покупок в нашем магазине.',
+            reply_markup=await personal_account_markup()
+        )
+
+    return await show_bought_item(query, state, redis, step)
+
 
 @router.callback_query(
-    F.data.in_(
-        [
-            PersonalOrdersCallbackData(flag=True).pack(),
-            PersonalOrdersCallbackData(flag=False).pack()
-        ]
-    )
+    PersonalOrdersCallbackData.filter(),
 )
-@delete_prev_messages_and_update_state
 async def paginate_over_bought_items(
         query: CallbackQuery,
         state: FSMContext,
+        redis: Redis,
+        callback_data: PersonalOrdersCallbackData,
 ) -> Awaitable:
-    return await paginate(
+
+    try:
+        step = await order_history_step(query.message.chat.id, callback_data)
+    except sqlalchemy.exc.SQLAlchemyError:
+        step = None
+
+    if step is None:
+        html = await render_template(template_name='errors/common.html')
+        return await replace_card(query, state, html, await main_menu_markup())
+
+    return await show_bought_item(query, state, redis, step, edit_in_place=True)
+
+
+async def show_bought_item(
+        query: CallbackQuery,
+        state: FSMContext,
+        redis: Redis,
+        step: Tuple[int, int, bool, bool],
+        edit_in_place: bool = False,
+):
+
+    order_id, item_id, has_next, has_prev = step
+
+    return await show_item(
         query,
         state,
+        redis,
         Item,
-        'orders',
-        PersonalOrdersCallbackData,
+        item_id,
+        has_next,
+        has_prev,
         'account/item_detail.html',
         bought_items_markup,
-        paginator_storage,
+        edit_in_place=edit_in_place,
+        cursor=PersonalOrdersCallbackData(order_id=order_id, item_id=item_id),
     )
 
 
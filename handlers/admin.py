@@ -0,0 +1,24 @@
+import sqlalchemy.exc
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import Message
+from aioredis import Redis
+
+from conf import bot_settings
+from middlewares.utils.state import rebuild_registered_users
+
+router = Router()
+
+
+@router.message(
+    Command(commands=['rebuild_users_filter']),
+    F.from_user.username == bot_settings.support_username.get_secret_value(),
+)
+async def rebuild_users_filter_handler(message: Message, redis: Redis) -> Message:
+
+    try:
+        registered_count = await rebuild_registered_users(redis)
+    except sqlalchemy.exc.SQLAlchemyError:
+        return await message.answer('<code>Упс, что-то пошло не так...</code>')
+
+    return await message.answer(f'<code>Фильтр пользователей перестроен, зарегистрировано: {registered_count}.</code>')
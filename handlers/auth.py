@@ -9,19 +9,20 @@ from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
+from aioredis import Redis
 from sqlalchemy import select
 
 from apps.mail.sender import send_email
 from apps.mail.code_gen import generate_code_for_restoring_password
 from database.models import *
 from database.handlers.utils.session import PostgresAsyncSession
-from database.handlers.utils.redis_client import connect_redis_url
 from database.models.exceptions.models_exc import *
 from keyboards.inline.app import main_menu_markup
 from keyboards.inline.auth import get_restore_password_keyboard, refuse_operations_keyboard, get_registration_keyboard
 from states.states import InitialState, RegState, RestoreState
 from handlers.utils.auxillary import validate_user_registration, password_matched, delete_prev_messages_and_update_state
 from handlers.app import main_menu_handler
+from middlewares.utils.state import start_auth_session, registered_users
 from utils.jinja_template import render_template
 
 router = Router()
@@ -29,12 +30,12 @@ router = Router()
 
 @router.message(Command(commands=['run', 'start']))
 @delete_prev_messages_and_update_state
-async def cmd_start_handler(message: Message, state: FSMContext) -> Message:
+async def cmd_start_handler(message: Message, state: FSMContext, redis: Redis) -> Message:
 
     state_level = await state.get_state()
 
     if state_level == InitialState.TO_AUTHENTICATION:
-        return await authenticate_user(message, state)
+        return await authenticate_user(message, state, redis)
 
     return await main_menu_handler(message, state)
 
@@ -169,7 +170,7 @@ async def input_password_confirmation(message: Message, state: FSMContext) -> Op
     F.text == 'Да',
 )
 @delete_prev_messages_and_update_state
-async def confirm_registration(message: Message, state: FSMContext) -> Message:
+async def confirm_registration(message: Message, state: FSMContext, redis: Redis) -> Message:
     data = await state.get_data()
 
     tg_id = message.from_user.id
@@ -184,7 +185,6 @@ async def confirm_registration(message: Message, state: FSMContext) -> Message:
     if not pwd_matched:
         return await message.answer('<code>Упс, пароли не совпадают... Может вы опечатались?</code>')
 
-    r_cli = await connect_redis_url()
     now = int(time.time())
 
     try:
@@ -205,10 +205,8 @@ async def confirm_registration(message: Message, state: FSMContext) -> Message:
         await transaction.rollback()
         return await message.answer('<code>Упс, что-то пошло не так...</code>')
     else:
-        await r_cli.hset(f'auth_hash:{tg_id}', mapping={
-            'hash': credentials.auth_hash,
-            'last_seen': now,
-        })
+        await registered_users.add(redis, tg_id)
+        await start_auth_session(redis, tg_id, credentials.auth_hash, now)
 
         return await message.answer('<code>Успешная регистрация!</code>', reply_markup=await main_menu_markup())
 
@@ -229,7 +227,7 @@ async def refuse_registration(message: Message, state: FSMContext) -> Message:
     InitialState.TO_AUTHENTICATION
 )
 @delete_prev_messages_and_update_state
-async def authenticate_user(message: Message, state: FSMContext) -> Optional[Message]:
+async def authenticate_user(message: Message, state: FSMContext, redis: Redis) -> Optional[Message]:
 
     tg_id = message.from_user.id
     pwd = message.text
@@ -269,11 +267,7 @@ async def authenticate_user(message: Message, state: FSMContext) -> Optional[Mes
 
                     await credentials.set_auth_hash()
 
-                    r_cli = await connect_redis_url()
-                    await r_cli.hset(f'auth_hash:{tg_id}', mapping={
-                        'hash': credentials.auth_hash,
-                        'last_seen': credentials.last_seen,
-                    })
+                    await start_auth_session(redis, tg_id, credentials.auth_hash, credentials.last_seen)
 
                     await state.set_state(InitialState.TO_APPLICATION)
 
@@ -4,6 +4,7 @@ from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.methods import EditMessageText
 from aiogram.types import CallbackQuery
+from aioredis import Redis
 from sqlalchemy import select
 
 from apps.cart.cart import CartManager
@@ -21,7 +22,7 @@ router = Router()
     F.data == 'show_cart',
 )
 @delete_prev_messages_and_update_state
-async def show_cart_handler(query: CallbackQuery, state: FSMContext):
+async def show_cart_handler(query: CallbackQuery, state: FSMContext, redis: Redis):
 
     tg_id = query.message.chat.id
     data = await state.get_data()
@@ -52,13 +53,11 @@ async def show_cart_handler(query: CallbackQuery, state: FSMContext):
         except sqlalchemy.exc.SQLAlchemyError:
             return await query.message.answer('<code>Упс, что-то пошло не так...</code>')
 
-    cart_items = data.get('in_cart')
+    cart = await CartManager.get_cart(tg_id, redis)
 
-    cart = await CartManager.get_cart(tg_id)
-
-    await cart.fill_up(cart_items)
-    items = await cart.get_items
-    total_price = await cart.calculate_sum_of_items()
+    contents = await cart.load()
+    items = list(contents)
+    total_price = contents.total
 
     current_address = data.get('current_address')
 
@@ -83,17 +82,18 @@ async def show_cart_handler(query: CallbackQuery, state: FSMContext):
     F.data == 'clean_cart_up',
 )
 @delete_prev_messages_and_update_state
-async def clean_cart_up(query: CallbackQuery, state: FSMContext):
+async def clean_cart_up(query: CallbackQuery, state: FSMContext, redis: Redis):
 
-    await state.update_data({'in_cart': []})
+    cart = await CartManager.get_cart(query.message.chat.id, redis)
+    await cart.clean_up()
 
-    return await show_cart_handler(query, state)
+    return await show_cart_handler(query, state, redis)
 
 
 @router.callback_query(
     F.data.startswith('pick_address'),
 )
-async def pick_address_handler(query: CallbackQuery, state: FSMContext):
+async def pick_address_handler(query: CallbackQuery, state: FSMContext, redis: Redis):
 
     picked_address_id = query.data.split(':')[-1]
     tg_id = query.message.chat.id
@@ -104,18 +104,17 @@ async def pick_address_handler(query: CallbackQuery, state: FSMContext):
 
     shipping_addresses = data.get('shipping_addresses')
 
-    cart_items = data.get('in_cart')
-
     if shipping_addresses is not None:
 
-        current_address = shipping_addresses[picked_address_id]
+        # Кодек хранилища сохраняет целочисленные ключи, данные из старого JSON-хранилища - строковые.
+        current_address = shipping_addresses.get(int(picked_address_id), shipping_addresses.get(picked_address_id))
 
         await state.update_data({'current_address': current_address, 'current_address_id': picked_address_id})
 
-        cart = await CartManager.get_cart(tg_id)
-        await cart.fill_up(cart_items)
-        items = await cart.get_items
-        total_price = await cart.calculate_sum_of_items()
+        cart = await CartManager.get_cart(tg_id, redis)
+        contents = await cart.load()
+        items = list(contents)
+        total_price = contents.total
 
         html = await render_template(
             'cart/cart_detail.html',
@@ -4,6 +4,7 @@ import sqlalchemy.exc
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, PreCheckoutQuery, ShippingQuery, Message
+from aioredis import Redis
 from sqlalchemy import insert, update, select, desc
 
 from bot import bot as balance_bot
@@ -12,7 +13,7 @@ from database.models.schemas.auth import Users, Addresses
 from database.models.schemas.commerce import Orders, OrderItem
 from database.session import AsyncSessionLocal
 from keyboards.inline.app import main_menu_markup, personal_account_markup
-from handlers.utils.auxillary import group_order, delete_prev_messages_and_update_state
+from handlers.utils.auxillary import delete_prev_messages_and_update_state
 from handlers.utils.options import shipping_options
 from states.states import PaymentsState
 from conf import bot_settings
@@ -24,19 +25,16 @@ router = Router()
     F.data == 'start_payment'
 )
 @delete_prev_messages_and_update_state
-async def start_payment_handler(query: CallbackQuery, state: FSMContext):
+async def start_payment_handler(query: CallbackQuery, state: FSMContext, redis: Redis):
 
     await state.set_state(PaymentsState.START_PAYMENT)
 
     tg_id = query.message.chat.id
 
-    data = await state.get_data()
-
-    in_cart = data.get('in_cart')
-    cart = await CartManager.get_cart(tg_id)
-    await cart.fill_up(in_cart)
+    cart = await CartManager.get_cart(tg_id, redis)
 
-    total_cost = await cart.calculate_sum_of_items()
+    contents = await cart.load()
+    total_cost = contents.total
 
     try:
         async with AsyncSessionLocal() as session:
@@ -52,23 +50,7 @@ async def start_payment_handler(query: CallbackQuery, state: FSMContext):
 
                 if order_id is not None:
 
-                    order_items = [
-                        {
-                            'order_id': order_id,
-                            'item_id': item.get('id'),
-                            'color': item.get('color') if item.get('color') != 'Без фильтра' else None,
-                            'size': item.get('size') if item.get('size') != 'Без фильтра' else None,
-                            'sex': item.get('sex').split('.')[-1] if item.get('sex') != 'Без фильтра' else None,
-                        }
-                        for item in await cart.get_items if item.get('id') is not None
-                    ]
-
-                    grouped_order_items = await group_order(order_items)
-
-                    values_to_insert = [
-                        {**dict(order_item), 'qty': qty}
-                        for order_item, qty in grouped_order_items.items()
-                    ]
+                    values_to_insert = contents.order_lines(order_id)
 
                     insert_stmt = insert(OrderItem).values(values_to_insert)
 
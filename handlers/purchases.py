@@ -1,22 +1,23 @@
-from typing import Dict
+from typing import Dict, Tuple
 
 import sqlalchemy.exc
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.methods import EditMessageReplyMarkup
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, Message, InputMediaPhoto
+from aioredis import Redis
+from sqlalchemy import Row
 
-from sqlalchemy import select, join, text
-
-from callback_data.callback_data import AvailableItemsCallbackData
+from callback_data.callback_data import AvailableItemsCallbackData, ItemGalleryCallbackData
 from apps.cart.cart import CartManager, Cart
+from database.handlers.utils.telegram_file_cache import telegram_files
 from database.models import *
-from database.session import AsyncSessionLocal
 from handlers.utils.named_entities import Item
 from keyboards.inline.purchases import get_search_filter_keyboard, items_markup
-from handlers.utils.auxillary import filter_products, paginate, delete_prev_messages_and_update_state
-from balance_bot.utils.paginator import Paginator
-from mem_storage import paginator_storage
+from handlers.utils.auxillary import (
+    filter_products, show_item, fetch_gallery_paths, replace_card, delete_prev_messages_and_update_state,
+)
+from handlers.utils.catalog import catalog_cursor, catalog_step
 from balance_bot.bot import bot as balance_bot
 
 router = Router()
@@ -28,9 +29,7 @@ router = Router()
 @delete_prev_messages_and_update_state
 async def search_filter_handler(query: CallbackQuery, state: FSMContext):
 
-    old_data = await state.get_data()
-
-    await state.set_data({key: value for key, value in old_data.items() if key == 'in_cart'})
+    await state.set_data({})
 
     return await query.message.answer(text='<code>Выберте подходящие фильтры:</code>',
                                       reply_markup=await get_search_filter_keyboard())
@@ -40,37 +39,35 @@ async def search_filter_handler(query: CallbackQuery, state: FSMContext):
     F.data == 'choose_brand',
 )
 async def choose_brand_handler(query: CallbackQuery, state: FSMContext):
-    await filter_products('brand_filter', Brands, query, state)
+    await filter_products('brand', query, state)
 
 
 @router.callback_query(
     F.data == 'choose_color',
 )
 async def choose_size_handler(query: CallbackQuery, state: FSMContext):
-    await filter_products('color_filter', Colors, query, state)
+    await filter_products('color', query, state)
 
 
 @router.callback_query(
     F.data == 'choose_sex',
 )
 async def choose_sex_handler(query: CallbackQuery, state: FSMContext):
-    await filter_products('sex_filter', Sex, query, state)
+    await filter_products('sex', query, state)
 
 
 @router.callback_query(
     F.data == 'choose_size',
 )
 async def choose_size_handler(query: CallbackQuery, state: FSMContext):
-    await filter_products('size_filter', Sizes, query, state)
+    await filter_products('size', query, state)
 
 
 @router.callback_query(
     F.data == 'apply_filters',
 )
 @delete_prev_messages_and_update_state
-async def apply_filters_handler(query: CallbackQuery, state: FSMContext) -> Message:
-
-    tg_id = query.message.chat.id
+async def apply_filters_handler(query: CallbackQuery, state: FSMContext, redis: Redis) -> Message:
 
     data = await state.get_data()
 
@@ -86,83 +83,129 @@ async def apply_filters_handler(query: CallbackQuery, state: FSMContext) -> Mess
     sex_title = sex.split(',')[-1].split('.')[-1]
     brand_title = brand.split(',')[-1]
 
+    cursor = catalog_cursor({'color': color, 'brand': brand, 'sex': sex, 'size': size})
+
     try:
-        async with AsyncSessionLocal() as session:
-            async with session.begin():
-                select_stmt = select(
-                    Items.id,
-                    Items.title,
-                    Items.description,
-                    Items.price,
-                    Brands.title,
-                    Images.path,
-                ).select_from(
-                    join(Items, ItemsImages, Items.id == ItemsImages.item_id).
-                    join(Images, ItemsImages.image_id == Images.id).
-                    join(Brands, Items.brand_id == Brands.id).
-                    join(ItemMeta, Items.id == ItemMeta.item_id)
-                ).where(
-                    ItemMeta.size.contains([float(size_title)]) if size_title != 'Без фильтра' else True,
-                    ItemMeta.color.contains([color_title]) if color_title != 'Без фильтра' else True,
-                    ItemMeta.sex == sex_title if sex_title != 'Без фильтра' else True,
-                    Brands.title == brand_title if brand_title != 'Без фильтра' else True
-                )
-
-                result = await session.execute(select_stmt)
-
-                data = result.fetchall()
-                paginator = Paginator(data)
-
-                async with paginator_storage:
-
-                    paginator_storage[tg_id] = paginator
-
-                if data:
-                    return await paginate_over_items(query, state)
-                else:
-                    return await query.message.answer(
-                        text='<code>К сожалению, по заданным вами фильтрам ничего не было найдено.'
-                             '\nПопробуете поискать еще?</code>',
-                        reply_markup=await get_search_filter_keyboard(
-                            color=color_title,
-                            brand=brand_title,
-                            sex=sex_title,
-                            size=size_title)
-                    )
+        step = await catalog_step(redis, cursor)
     except sqlalchemy.exc.SQLAlchemyError:
         return await query.message.answer('<code>Упс, что-то пошло не так...</code>')
 
+    if step is None:
+        return await query.message.answer(
+            text='<code>К сожалению, по заданным вами фильтрам ничего не было найдено.'
+                 '\nПопробуете поискать еще?</code>',
+            reply_markup=await get_search_filter_keyboard(
+                color=color_title,
+                brand=brand_title,
+                sex=sex_title,
+                size=size_title)
+        )
+
+    return await show_catalog_item(query, state, redis, cursor, step)
+
 
 @router.callback_query(
-    F.data.in_(
-        [
-            AvailableItemsCallbackData(flag=True).pack(),
-            AvailableItemsCallbackData(flag=False).pack()
-        ]
-    )
+    AvailableItemsCallbackData.filter(),
 )
-@delete_prev_messages_and_update_state
 async def paginate_over_items(
         query: CallbackQuery,
-        state: FSMContext
+        state: FSMContext,
+        redis: Redis,
+        callback_data: AvailableItemsCallbackData,
 ):
 
-    return await paginate(
+    try:
+        step = await catalog_step(redis, callback_data)
+    except sqlalchemy.exc.SQLAlchemyError:
+        return await replace_card(query, state, '<code>Упс, что-то пошло не так...</code>', None)
+
+    # Товары в этом направлении могли закончиться, пока пользователь листал каталог.
+    if step is None:
+        return await replace_card(
+            query,
+            state,
+            '<code>Результаты поиска устарели, пожалуйста, повторите поиск.</code>',
+            await get_search_filter_keyboard(),
+        )
+
+    return await show_catalog_item(query, state, redis, callback_data, step, edit_in_place=True)
+
+
+async def show_catalog_item(
+        query: CallbackQuery,
+        state: FSMContext,
+        redis: Redis,
+        cursor: AvailableItemsCallbackData,
+        step: Tuple[Row, bool, bool],
+        edit_in_place: bool = False,
+):
+
+    row, has_next, has_prev = step
+    item_id = row.item_id
+
+    return await show_item(
         query,
         state,
+        redis,
         Item,
-        'apply_filters',
-        AvailableItemsCallbackData,
+        item_id,
+        has_next,
+        has_prev,
         'account/item_detail.html',
         items_markup,
-        paginator_storage,
+        row=row,
+        edit_in_place=edit_in_place,
+        cursor=cursor.model_copy(update={'last_id': item_id}),
     )
 
 
+@router.callback_query(
+    ItemGalleryCallbackData.filter(),
+)
+async def item_gallery_handler(
+        query: CallbackQuery,
+        state: FSMContext,
+        redis: Redis,
+        callback_data: ItemGalleryCallbackData,
+):
+    """ Догружает остальные изображения товара только по запросу пользователя.
+
+    id отправленных сообщений запоминаются в состоянии, они удаляются вместе с карточкой.
+    """
+
+    try:
+        paths = await fetch_gallery_paths(callback_data.item_id)
+    except sqlalchemy.exc.SQLAlchemyError:
+        return await query.answer('Упс, что-то пошло не так...')
+
+    if not paths:
+        return await query.answer('У этого товара нет других фото.')
+
+    await query.answer()
+
+    data = await state.get_data()
+    gallery_msg_ids = data.get('gallery_msg_ids') or []
+
+    # В альбоме Telegram должно быть от 2 до 10 изображений.
+    for start in range(0, len(paths), 10):
+        chunk = paths[start:start + 10]
+        photos = [await telegram_files.photo(redis, path) for path in chunk]
+
+        if len(chunk) == 1:
+            messages = [await query.message.answer_photo(photos[0])]
+        else:
+            messages = await query.message.answer_media_group([InputMediaPhoto(media=photo) for photo in photos])
+
+        gallery_msg_ids.extend(message.message_id for message in messages)
+        await state.update_data({'gallery_msg_ids': gallery_msg_ids})
+
+        await telegram_files.remember_all(redis, chunk, photos, messages)
+
+
 @router.callback_query(
     F.data == 'add_to_cart'
 )
-async def add_to_cart_handler(query: CallbackQuery, state: FSMContext):
+async def add_to_cart_handler(query: CallbackQuery, state: FSMContext, redis: Redis):
 
     data = await state.get_data()
     current_item = data.get('current_item')
@@ -181,9 +224,7 @@ async def add_to_cart_handler(query: CallbackQuery, state: FSMContext):
         await state.update_data({'current_item': current_item})
 
     tg_id = query.message.chat.id
-    cart: Cart = await CartManager.get_cart(tg_id)
-    prev_cart_data = data.get('in_cart')
-    await cart.fill_up(prev_cart_data)
+    cart: Cart = await CartManager.get_cart(tg_id, redis)
 
     if current_item is not None:
         await cart.add_item(current_item)
@@ -193,15 +234,13 @@ async def add_to_cart_handler(query: CallbackQuery, state: FSMContext):
 @router.callback_query(
     F.data == 'delete_from_cart'
 )
-async def delete_from_cart_handler(query: CallbackQuery, state: FSMContext):
+async def delete_from_cart_handler(query: CallbackQuery, state: FSMContext, redis: Redis):
 
     data = await state.get_data()
     current_item = data.get('current_item')
 
     tg_id = query.message.chat.id
-    cart: Cart = await CartManager.get_cart(tg_id)
-    prev_cart_data = data.get('in_cart')
-    await cart.fill_up(prev_cart_data)
+    cart: Cart = await CartManager.get_cart(tg_id, redis)
 
     if current_item is not None:
         await cart.remove_item(current_item)
@@ -216,16 +255,18 @@ async def update_cart_and_reply(query: CallbackQuery, state: FSMContext, cart: C
 
     has_next, has_prev = bool(data.get('has_next', False)), bool(data.get('has_prev', False))
 
-    cart_items = await cart.get_items
-
-    await state.update_data({'in_cart': cart_items})
-
-    update_cart = len([value.get('id') for value in cart_items if value and value.get('id') == current_item.get('id')])
+    update_cart = await cart.count_item(current_item.get('id'))
 
     current_filter = data.get('current_filters')
 
     await EditMessageReplyMarkup(
         message_id=last_bot_msg_id,
         chat_id=query.message.chat.id,
-        reply_markup=await items_markup(has_next, has_prev, update_cart=update_cart, current_filter=current_filter),
+        reply_markup=await items_markup(
+            has_next,
+            has_prev,
+            update_cart=update_cart,
+            current_filter=current_filter,
+            cursor=catalog_cursor(current_filter, current_item.get('id')),
+        ),
     ).as_(balance_bot)
@@ -1,8 +1,7 @@
 import functools
 import re
-import itertools
-from typing import Optional, Any, Union, Coroutine, Callable
-from bisect import bisect_left
+from html import escape, unescape
+from typing import Optional, Any, Union, Coroutine, Callable, List
 
 import aiogram.exceptions
 import sqlalchemy.exc
@@ -10,19 +9,25 @@ import sqlalchemy.exc
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State
 from aiogram.methods import EditMessageReplyMarkup, SendMessage
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, CallbackQuery, FSInputFile
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, CallbackQuery, FSInputFile, InputMediaPhoto
+from aioredis import Redis
 
-from sqlalchemy import select
+from sqlalchemy import select, ScalarSelect
 
+from apps.cart.cart import CartManager
+from database.models import Items, Brands, Images, ItemsImages
+from database.handlers.utils.telegram_file_cache import telegram_files
 from database.session import AsyncSessionLocal
+from handlers.utils.catalog import get_filter_dictionary
 from keyboards.inline.app import bought_items_markup, main_menu_markup
 from keyboards.inline.auth import refuse_operations_keyboard
 from keyboards.inline.purchases import get_search_filter_keyboard
 from utils.jinja_template import render_template
-from utils.paginator import PaginatorStorage
-from serializers.serializers import RedisSerializer
 from bot import bot as balance_bot
 
+# Лимит подписи к фото в Telegram, в символах без разметки.
+CAPTION_LIMIT = 1024
+
 
 async def validate_user_registration(
         message: Message,
@@ -104,49 +109,38 @@ async def password_matched(password: str, password_confirmation: str) -> bool:
 
 async def filter_products(
         filter_name: str,
-        table,
         query: CallbackQuery,
         state: FSMContext
 ) -> Optional[Message]:
+    """ Переключает фильтр filter_name на следующее значение справочника.
+
+    Справочник берется из общего кеша, в состоянии хранятся только позиция в нем и выбранное значение.
+    """
 
     data = await state.get_data()
     last_bot_msg_id = data.get('last_bot_msg_id')
 
-    product_filter = data.get(filter_name)
-
-    if not product_filter:
-        try:
-            async with AsyncSessionLocal() as session:
-                async with session.begin():
-                    select_stmt = select(table.id, table.title)
-                    objects = await session.execute(select_stmt)
-                    objects = objects.fetchall()
-
-                    await state.update_data(
-                        {filter_name: ':'.join([','.join(tuple(map(str, obj))) for obj in objects + [('0', 'Без фильтра')]])})
-        except sqlalchemy.exc.SQLAlchemyError:
-
-            html = await render_template('errors/common.html')
-            bot_message = await query.message.answer(
-                text=html,
-                reply_markup=await main_menu_markup(),
-            )
-            await state.update_data({'last_bot_msg_id': bot_message.message_id})
-            return bot_message
-    else:
-        objects = [tuple(obj.split(',')) for obj in product_filter.split(':')] + [('0', 'Без фильтра')]
+    try:
+        objects = await get_filter_dictionary(filter_name)
+    except sqlalchemy.exc.SQLAlchemyError:
 
-    prev_obj = data.get(f'current_{filter_name.split("_")[0]}')
-
-    objects_gen = itertools.cycle(objects)
+        html = await render_template('errors/common.html')
+        bot_message = await query.message.answer(
+            text=html,
+            reply_markup=await main_menu_markup(),
+        )
+        await state.update_data({'last_bot_msg_id': bot_message.message_id})
+        return bot_message
 
-    current_obj = next(
-        itertools.islice(objects_gen, int(prev_obj.split(',')[0]) if prev_obj is not None else 0, None), None
-    )
+    position = (data.get(f'{filter_name}_position', -1) + 1) % len(objects)
+    current_obj = objects[position]
 
     if current_obj:
 
-        await state.update_data({f'current_{filter_name.split("_")[0]}': ','.join(map(str, current_obj))})
+        await state.update_data({
+            f'{filter_name}_position': position,
+            f'current_{filter_name}': ','.join(current_obj),
+        })
 
         data = await state.get_data()
 
@@ -166,81 +160,197 @@ async def filter_products(
         ).as_(balance_bot)
 
 
-async def paginate(
+def primary_image_path() -> ScalarSelect:
+    """ Путь к главному изображению товара: Items.primary_image_id, иначе изображение с наименьшим id. """
+
+    return select(Images.display_path).select_from(ItemsImages).join(
+        Images, ItemsImages.image_id == Images.id,
+    ).where(
+        ItemsImages.item_id == Items.id,
+    ).order_by(
+        ItemsImages.image_id.is_distinct_from(Items.primary_image_id), ItemsImages.image_id,
+    ).limit(1).correlate(Items).scalar_subquery()
+
+
+async def fetch_item_row(item_id: int) -> Optional[tuple]:
+    """ Строка товара для карточки: id, название, описание, цена, бренд и путь к главному изображению. """
+
+    image_path = primary_image_path()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            result = await session.execute(
+                select(
+                    Items.id,
+                    Items.title,
+                    Items.description,
+                    Items.price,
+                    Brands.title,
+                    image_path,
+                ).select_from(Items)
+                .join(Brands, Items.brand_id == Brands.id)
+                .filter(Items.id == item_id, image_path.is_not(None))
+            )
+
+            return result.first()
+
+
+async def fetch_gallery_paths(item_id: int) -> List[str]:
+    """ Пути к остальным изображениям товара, кроме главного. """
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            paths = await session.scalars(
+                select(Images.display_path).select_from(Items).join(
+                    ItemsImages, Items.id == ItemsImages.item_id,
+                ).join(
+                    Images, ItemsImages.image_id == Images.id,
+                ).where(
+                    Items.id == item_id,
+                ).order_by(
+                    ItemsImages.image_id.is_distinct_from(Items.primary_image_id), ItemsImages.image_id,
+                ).offset(1)
+            )
+
+            return paths.all()
+
+
+async def show_item(
         query: CallbackQuery,
         state: FSMContext,
+        redis: Redis,
         next_obj: Any,
-        previous_callback_name: str,
-        callback_data: Any,
+        item_id: int,
+        has_next: bool,
+        has_prev: bool,
         template_name: str,
         reply_coroutine,
-        paginator_storage: PaginatorStorage,
         is_cart: bool = False,
+        row: Optional[tuple] = None,
+        edit_in_place: bool = False,
+        **markup_kwargs,
 ):
+    """ Показывает карточку товара item_id одним сообщением: фото, описание в подписи и клавиатура reply_coroutine.
+
+    row - уже прочитанная строка товара в формате fetch_item_row, тогда товар повторно не запрашивается.
+    edit_in_place - заменить карточку, на кнопку которой нажали, одним editMessageMedia вместо удаления и отправки.
+    """
+
     data = await state.get_data()
 
     tg_id = query.message.chat.id
 
-    async with paginator_storage:
-        paginator = paginator_storage[tg_id]
+    if row is None:
+        try:
+            row = await fetch_item_row(item_id)
+        except sqlalchemy.exc.SQLAlchemyError:
+            row = None
 
-    c_data = query.data
-    if c_data == previous_callback_name:
-        c_data = callback_data(flag=True)
-        flag = c_data.flag
-    else:
-        flag = True if c_data.split(':')[-1] == '1' else False
+    if row is None:
+        html = await render_template('errors/common.html')
+
+        if edit_in_place:
+            return await replace_card(query, state, html, await main_menu_markup())
+
+        return await query.message.answer(
+            text=html,
+            reply_markup=await main_menu_markup(),
+        )
 
-    paginator.direction = flag
-    paginator_value = next_obj(*next(paginator))
+    paginator_value = next_obj(*row)
 
     update_cart = False
     if is_cart is not None:
 
-        cart_has_values = data.get('in_cart')
+        cart = await CartManager.get_cart(tg_id, redis)
+        update_cart = await cart.count_item(paginator_value.id)
 
-        if not cart_has_values:
-            await state.update_data({'in_cart': []})
-        else:
-            cart_items_ids = [item.get('id') for item in cart_has_values if item]
-            idx_of_obj_in_cart = bisect_left(cart_items_ids, paginator_value.id)
-            update_cart = len([value for value in cart_items_ids if value == paginator_value.id]) \
-                if (idx_of_obj_in_cart != len(cart_items_ids) and cart_items_ids[idx_of_obj_in_cart] == paginator_value.id) \
-                else 0
+        await state.update_data({'current_item': paginator_value._asdict()})
 
-        current_item = paginator_value._asdict()
-        current_item_serialized = await RedisSerializer(current_item).__call__()
-        await state.update_data({'current_item': current_item_serialized})
+    caption = await render_item_caption(template_name, paginator_value)
 
-    html = await render_template(
-        template_name,
-        item_title=paginator_value.title,
-        item_description=paginator_value.description,
-        item_price=paginator_value.price,
-        brand_name=paginator_value.brand_name.upper(),
-    )
-
-    has_next = paginator.has_next()
-    has_prev = paginator.has_prev()
     await state.update_data({'has_next': has_next, 'has_prev': has_prev})
 
     current_filter = data.get('current_filters')
 
-    bot_message_photo = await query.message.answer_photo(
-        FSInputFile(paginator_value.image_path),
-        caption=paginator_value.title,
-    )
-    bot_message = await query.message.answer(
-        text=html,
-        reply_markup=await reply_coroutine(has_next, has_prev, update_cart=update_cart, current_filter=current_filter),
-    )
-    await state.update_data(
-        {
-            'last_bot_msg_photo_id': bot_message_photo.message_id,
-        }
+    reply_markup = await reply_coroutine(
+        has_next, has_prev, update_cart=update_cart, current_filter=current_filter, **markup_kwargs,
     )
 
-    return bot_message, bot_message_photo
+    photo = await telegram_files.photo(redis, paginator_value.image_path)
+
+    bot_message = None
+    if edit_in_place and query.message.photo:
+        try:
+            bot_message = await query.message.edit_media(
+                media=InputMediaPhoto(media=photo, caption=caption),
+                reply_markup=reply_markup,
+            )
+        except aiogram.exceptions.TelegramBadRequest:
+            # Слишком старое сообщение Telegram редактировать не дает: карточка отправляется заново.
+            ...
+
+    if edit_in_place:
+        # Состояние запомнит только новую карточку, поэтому нажатое сообщение (если его не отредактировали)
+        # и сообщения, которые бот отслеживал до него, удаляются, чтобы не остаться в чате.
+        stale_ids = {data.get('last_bot_msg_id'), data.get('last_bot_msg_photo_id')}
+
+        if isinstance(bot_message, Message):
+            stale_ids.discard(bot_message.message_id)
+        else:
+            stale_ids.add(query.message.message_id)
+
+        for message_id in stale_ids - {None}:
+            await delete_prev_messages(query, message_id, None)
+
+    await delete_gallery_messages(query, state, data)
+
+    if not isinstance(bot_message, Message):
+        bot_message = await query.message.answer_photo(photo, caption=caption, reply_markup=reply_markup)
+
+    if isinstance(photo, FSInputFile):
+        await telegram_files.remember(redis, paginator_value.image_path, bot_message)
+
+    await state.update_data({'last_bot_msg_id': bot_message.message_id, 'last_bot_msg_photo_id': None})
+
+    return bot_message
+
+
+async def render_item_caption(template_name: str, item: Any) -> str:
+    """ Подпись карточки товара. Описание, а если его не хватило, и название сокращаются,
+    чтобы подпись уложилась в лимит Telegram.
+    """
+
+    def shorten(value: str, excess: int) -> str:
+        return value[:-(excess + 1)].rstrip() + '…' if excess + 1 < len(value) else ''
+
+    description = item.description or ''
+    title = item.title
+
+    while True:
+        html = await render_template(
+            template_name,
+            item_title=title,
+            item_description=description,
+            item_price=item.price,
+            brand_name=item.brand_name.upper(),
+        )
+        caption = f'<b>{escape(title)}</b>\n{html}'
+
+        text = unescape(re.sub(r'<[^>]+>', '', caption))
+        excess = len(text) - CAPTION_LIMIT
+
+        if excess <= 0:
+            return caption
+
+        if description:
+            description = shorten(description, excess)
+        elif title:
+            # Название входит в подпись дважды: заголовком и в шаблоне.
+            title = shorten(title, -(-excess // max(text.count(title), 1)))
+        else:
+            # Не уложился даже шаблон без названия и описания: подпись обрезается как простой текст.
+            return escape(text[:CAPTION_LIMIT - 1] + '…')
 
 
 async def delete_prev_messages(
@@ -271,6 +381,24 @@ async def delete_prev_messages(
             ...
 
 
+async def delete_gallery_messages(
+        query_or_message: Union[CallbackQuery, Message],
+        state: FSMContext,
+        data: dict,
+) -> None:
+    """ Удаляет изображения галереи, догруженные к прошлой карточке (см. item_gallery_handler). """
+
+    gallery_msg_ids = data.get('gallery_msg_ids')
+
+    if not gallery_msg_ids:
+        return
+
+    for message_id in gallery_msg_ids:
+        await delete_prev_messages(query_or_message, message_id, None)
+
+    await state.update_data({'gallery_msg_ids': None})
+
+
 async def update_state_after_deleting_prev_message(result_coro: Any, state: FSMContext):
 
     if isinstance(result_coro, tuple) and len(result_coro) == 2:
@@ -303,6 +431,7 @@ def delete_prev_messages_and_update_state(coro: Callable):
         last_bot_msg_photo_id = data.get('last_bot_msg_photo_id')
 
         await delete_prev_messages(query_or_message, last_bot_msg_id, last_bot_msg_photo_id)
+        await delete_gallery_messages(query_or_message, state, data)
 
         result_coro = await coro(query_or_message, state, *args, **kwargs)
 
@@ -313,15 +442,8 @@ def delete_prev_messages_and_update_state(coro: Callable):
     return wrapper
 
 
-async def group_order(order_items: list[dict]) -> dict:
-
-    grouped_order_items = {}
-
-    for order_item in order_items:
-        item = tuple(order_item.items())
-        if item not in grouped_order_items:
-            grouped_order_items[item] = 1
-        else:
-            grouped_order_items[item] += 1
+@delete_prev_messages_and_update_state
+async def replace_card(query: CallbackQuery, state: FSMContext, text: str, reply_markup: Any) -> Message:
+    """ Удаляет карточку товара и отвечает вместо нее сообщением text. """
 
-    return grouped_order_items
+    return await query.message.answer(text=text, reply_markup=reply_markup)
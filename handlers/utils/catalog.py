@@ -0,0 +1,324 @@
+import asyncio
+import logging
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import sqlalchemy.exc
+from aioredis import Redis
+from sqlalchemy import select, Select, Row
+
+from callback_data.callback_data import AvailableItemsCallbackData
+from database.models import CatalogSearch, CatalogVersion, Brands, Colors, Sex, Sizes
+from database.session import AsyncSessionLocal
+from middlewares.settings import CATALOG_INDEX_ENABLED, CATALOG_CACHE_TTL
+from utils.bitmap_index import BitmapIndex
+from utils.keyed_lock import KeyedLock
+
+# Битовый индекс витрины catalog_search, общий для всех апдейтов процесса. None - индекс еще не построен.
+catalog_index: Optional[BitmapIndex] = None
+
+# Последняя прочитанная версия витрины. None - версия еще не прочитана.
+catalog_version: Optional[int] = None
+
+# Замки на ключ выдачи в Redis: выдачу заполняет первый поиск, остальные ждут его результат.
+catalog_cache_locks = KeyedLock()
+
+NO_FILTER = ('0', 'Без фильтра')
+
+FILTER_TABLES = {'brand': Brands, 'color': Colors, 'sex': Sex, 'size': Sizes}
+
+# Справочники фильтров, общие для всех пользователей процесса: (id, title) строками и NO_FILTER в конце.
+# Перечитываются вместе с индексом, когда меняется версия витрины.
+filter_dictionaries: Dict[str, List[Tuple[str, str]]] = {}
+filter_dictionaries_version: Optional[int] = None
+
+
+def catalog_cursor(current_filters: Optional[dict], last_id: int = 0, forward: bool = True) -> AvailableItemsCallbackData:
+    """ Курсор каталога из фильтров состояния вида {'brand': '3,Balance', ...}. 0 - фильтр не задан. """
+
+    current_filters = current_filters or {}
+
+    filter_ids = {
+        key: int(current_filters.get(key, '0').split(',')[0])
+        for key in ('brand', 'size', 'color', 'sex')
+    }
+
+    return AvailableItemsCallbackData(**filter_ids, last_id=last_id, forward=forward)
+
+
+def catalog_filter_key(size: int = 0, color: int = 0, sex: int = 0) -> int:
+    """ Ключ фильтра витрины catalog_search, совпадает с SQL-функцией commerce.catalog_filter_key. """
+
+    return (size << 40) + (color << 20) + sex
+
+
+def catalog_rows() -> Select:
+    """ Карточки товаров витрины: (id, title, description, price, brand, image_path), как у fetch_item_row. """
+
+    return select(
+        CatalogSearch.item_id,
+        CatalogSearch.title,
+        CatalogSearch.description,
+        CatalogSearch.price,
+        CatalogSearch.brand_title,
+        CatalogSearch.image_path,
+    )
+
+
+def catalog_filtered(select_stmt: Select, cursor: AvailableItemsCallbackData) -> Select:
+    """ Фильтры курсора для запроса к catalog_search. """
+
+    if cursor.size or cursor.color or cursor.sex:
+        select_stmt = select_stmt.where(
+            CatalogSearch.variant_keys.contains([catalog_filter_key(cursor.size, cursor.color, cursor.sex)]),
+        )
+
+    if cursor.brand:
+        select_stmt = select_stmt.where(CatalogSearch.brand_id == cursor.brand)
+
+    return select_stmt
+
+
+def catalog_query(cursor: AvailableItemsCallbackData) -> Select:
+    """ Запрос карточек товаров после cursor.last_id в направлении cursor.forward с фильтрами курсора.
+
+    Читает только витрину catalog_search: в ней уже лежат доступные товары с картинкой и вариантами в наличии.
+    """
+
+    select_stmt = catalog_filtered(catalog_rows(), cursor)
+
+    if cursor.forward:
+        return select_stmt.where(CatalogSearch.item_id > cursor.last_id).order_by(CatalogSearch.item_id)
+
+    return select_stmt.where(CatalogSearch.item_id < cursor.last_id).order_by(CatalogSearch.item_id.desc())
+
+
+def catalog_terms(cursor: AvailableItemsCallbackData) -> List[Hashable]:
+    """ Термы битового индекса для фильтров курсора. """
+
+    terms = []
+
+    if cursor.brand:
+        terms.append(('brand', cursor.brand))
+    if cursor.size or cursor.color or cursor.sex:
+        terms.append(('key', catalog_filter_key(cursor.size, cursor.color, cursor.sex)))
+
+    return terms
+
+
+def item_terms(brand_id: Optional[int], variant_keys: List[int]) -> List[Hashable]:
+    """ Термы битового индекса для строки витрины. """
+
+    return [('brand', brand_id), *(('key', key) for key in variant_keys)]
+
+
+async def load_catalog_index() -> BitmapIndex:
+    """ Строит битовый индекс по всей витрине catalog_search. """
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            version = await session.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+            rows = await session.stream(select(CatalogSearch.item_id, CatalogSearch.brand_id, CatalogSearch.variant_keys))
+
+            return BitmapIndex.build(
+                [(item_id, item_terms(brand_id, variant_keys)) async for item_id, brand_id, variant_keys in rows],
+                version=version or 0,
+            )
+
+
+async def load_filter_dictionaries() -> Dict[str, List[Tuple[str, str]]]:
+
+    dictionaries = {}
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            for filter_name, table in FILTER_TABLES.items():
+                rows = await session.execute(select(table.id, table.title).order_by(table.id))
+                dictionaries[filter_name] = [(str(obj_id), str(title)) for obj_id, title in rows] + [NO_FILTER]
+
+    return dictionaries
+
+
+async def get_filter_dictionary(filter_name: str) -> List[Tuple[str, str]]:
+    """ Справочник фильтра из общего кеша. Если кеш еще не загружен, загружает его. """
+
+    global filter_dictionaries
+
+    if not filter_dictionaries:
+        filter_dictionaries = await load_filter_dictionaries()
+
+    return filter_dictionaries[filter_name]
+
+
+async def refresh_catalog() -> bool:
+    """ Сверяет версию витрины и при ее изменении перечитывает справочники фильтров и перестраивает индекс.
+
+    Возвращает True, если индекс перестроен.
+    Версия запоминается и при выключенном индексе: ей помечаются закешированные в Redis выдачи.
+    """
+
+    global catalog_index, catalog_version, filter_dictionaries, filter_dictionaries_version
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            catalog_version = await session.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+
+    if filter_dictionaries_version is None or filter_dictionaries_version != catalog_version:
+        filter_dictionaries = await load_filter_dictionaries()
+        filter_dictionaries_version = catalog_version
+
+    if not CATALOG_INDEX_ENABLED:
+        return False
+
+    if catalog_index is not None and catalog_index.version == catalog_version:
+        return False
+
+    catalog_index = await load_catalog_index()
+
+    logging.getLogger(__name__).info(
+        'Catalog index built: %s items, version %s, %s bytes',
+        len(catalog_index), catalog_index.version, catalog_index.memory_size(),
+    )
+
+    return True
+
+
+async def keep_catalog_fresh(interval: int) -> None:
+    """ Фоновая задача: раз в interval секунд сверяет версию витрины и обновляет справочники и индекс. """
+
+    while True:
+        try:
+            await refresh_catalog()
+        except sqlalchemy.exc.SQLAlchemyError as sql_err:
+            logging.getLogger(__name__).error(str(sql_err))
+        except Exception:
+            logging.getLogger(__name__).exception('Catalog refresh failed')
+
+        await asyncio.sleep(interval)
+
+
+def catalog_cache_key(cursor: AvailableItemsCallbackData, version: int) -> str:
+    return f'catalog:ids:{version}:{cursor.brand}:{cursor.size}:{cursor.color}:{cursor.sex}'
+
+
+async def cached_catalog_ids(redis: Redis, cursor: AvailableItemsCallbackData, limit: int) -> Optional[List[int]]:
+    """ До limit id после курсора из общей для всех пользователей выдачи по фильтрам курсора.
+
+    Выдача хранится в Redis отсортированным множеством id под ключом с версией витрины и живет CATALOG_CACHE_TTL.
+    Член 0 отмечает заполненную выдачу, поэтому пустая выдача тоже кешируется.
+    Одинаковые поиски, пришедшие одновременно, ждут один запрос к Postgres.
+    Возвращает None, если версия витрины еще неизвестна.
+    """
+
+    version = catalog_version
+
+    if version is None:
+        return None
+
+    key = catalog_cache_key(cursor, version)
+
+    ids = await read_catalog_ids(redis, key, cursor, limit)
+
+    if ids is None:
+        async with catalog_cache_locks(key):
+            ids = await read_catalog_ids(redis, key, cursor, limit)
+
+            if ids is None:
+                async with AsyncSessionLocal() as session:
+                    async with session.begin():
+                        all_ids = (await session.scalars(catalog_filtered(select(CatalogSearch.item_id), cursor))).all()
+
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.delete(key)
+                    pipe.zadd(key, {0: 0})
+                    for start in range(0, len(all_ids), 10000):
+                        pipe.zadd(key, {item_id: item_id for item_id in all_ids[start:start + 10000]})
+                    pipe.expire(key, CATALOG_CACHE_TTL)
+                    await pipe.execute()
+
+                ids = await read_catalog_ids(redis, key, cursor, limit)
+
+    return ids
+
+
+async def read_catalog_ids(
+        redis: Redis,
+        key: str,
+        cursor: AvailableItemsCallbackData,
+        limit: int,
+) -> Optional[List[int]]:
+    """ Keyset по отсортированному множеству выдачи. None - выдачи в кеше нет. """
+
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.exists(key)
+
+        if cursor.forward:
+            pipe.zrangebyscore(key, f'({cursor.last_id}', '+inf', start=0, num=limit)
+        else:
+            pipe.zrevrangebyscore(key, f'({cursor.last_id}', '(0', start=0, num=limit)
+
+        exists, ids = await pipe.execute()
+
+    if not exists:
+        return None
+
+    return [int(item_id) for item_id in ids]
+
+
+async def catalog_step(redis: Redis, cursor: AvailableItemsCallbackData) -> Optional[Tuple[Row, bool, bool]]:
+    """ Следующий (или предыдущий) товар после cursor.last_id по ключу item_id.
+
+    id находятся в битовом индексе, а если он выключен или еще не построен - в общей выдаче в Redis.
+    Из базы читается только показываемая карточка.
+    Пока версия витрины неизвестна или индекс отстал от витрины, товар ищется запросом к catalog_search.
+    Возвращает (строка товара, has_next, has_prev) либо None, если в этом направлении товаров нет.
+    Строка товара - (id, title, description, price, brand, image_path), как у fetch_item_row.
+    """
+
+    index = catalog_index
+
+    if index is not None:
+        bits = index.match(*catalog_terms(cursor))
+
+        if cursor.forward:
+            ids = BitmapIndex.after(bits, cursor.last_id, 2)
+        else:
+            ids = BitmapIndex.before(bits, cursor.last_id, 2)
+    else:
+        ids = await cached_catalog_ids(redis, cursor, 2)
+
+        if ids is None:
+            return await catalog_step_sql(cursor)
+
+    if not ids:
+        return None
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            row = (await session.execute(catalog_rows().where(CatalogSearch.item_id == ids[0]))).first()
+
+    # Товар убрали из витрины после последнего обновления индекса или выдачи.
+    if row is None:
+        return await catalog_step_sql(cursor)
+
+    return catalog_page(cursor, row, len(ids) > 1)
+
+
+async def catalog_step_sql(cursor: AvailableItemsCallbackData) -> Optional[Tuple[Row, bool, bool]]:
+
+    # Вторая строка показывает, есть ли товары дальше в этом направлении.
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            rows = (await session.execute(catalog_query(cursor).limit(2))).all()
+
+    if not rows:
+        return None
+
+    return catalog_page(cursor, rows[0], len(rows) > 1)
+
+
+def catalog_page(cursor: AvailableItemsCallbackData, row: Row, has_more: bool) -> Tuple[Row, bool, bool]:
+
+    if cursor.forward:
+        return row, has_more, cursor.last_id > 0
+
+    return row, True, has_more
@@ -0,0 +1,57 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import select, or_, and_
+
+from callback_data.callback_data import PersonalOrdersCallbackData
+from database.models import Users, Orders, OrderItem, Items
+from database.session import AsyncSessionLocal
+
+
+async def order_history_step(
+        tg_id: int,
+        cursor: PersonalOrdersCallbackData,
+) -> Optional[Tuple[int, int, bool, bool]]:
+    """ Следующий (или предыдущий) купленный товар после позиции (cursor.order_id, cursor.item_id).
+
+    Покупки упорядочены по ключу (Orders.id по убыванию, item_id по возрастанию): сначала новые заказы.
+    order_id == 0 означает начало истории.
+    Возвращает (order_id, item_id, has_next, has_prev) либо None, если в этом направлении покупок нет.
+    """
+
+    select_stmt = select(Orders.id, OrderItem.item_id).distinct().select_from(Orders).join(
+        Users, Orders.user_id == Users.id,
+    ).join(
+        OrderItem, Orders.id == OrderItem.order_id,
+    ).join(
+        Items, OrderItem.item_id == Items.id,
+    ).where(
+        Users.tg_id == tg_id, Orders.paid.is_(True),
+    )
+
+    if cursor.forward:
+        if cursor.order_id:
+            select_stmt = select_stmt.where(or_(
+                Orders.id < cursor.order_id,
+                and_(Orders.id == cursor.order_id, OrderItem.item_id > cursor.item_id),
+            ))
+        select_stmt = select_stmt.order_by(Orders.id.desc(), OrderItem.item_id)
+    else:
+        select_stmt = select_stmt.where(or_(
+            Orders.id > cursor.order_id,
+            and_(Orders.id == cursor.order_id, OrderItem.item_id < cursor.item_id),
+        )).order_by(Orders.id, OrderItem.item_id.desc())
+
+    # Вторая строка показывает, есть ли покупки дальше в этом направлении.
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            rows = (await session.execute(select_stmt.limit(2))).all()
+
+    if not rows:
+        return None
+
+    (order_id, item_id), has_more = rows[0], len(rows) > 1
+
+    if cursor.forward:
+        return order_id, item_id, has_more, cursor.order_id > 0
+
+    return order_id, item_id, True, has_more
@@ -1,6 +1,6 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from callback_data.callback_data import PersonalOrdersCallbackData
+from callback_data.callback_data import PersonalOrdersCallbackData, ItemGalleryCallbackData
 from conf import bot_settings
 
 
@@ -53,14 +53,24 @@ async def bought_items_markup(has_next: bool, has_prev: bool, **kwargs) -> Inlin
 
     buttons = []
 
+    cursor: PersonalOrdersCallbackData = kwargs.get('cursor', PersonalOrdersCallbackData())
+
     if has_prev:
-        prev_button = InlineKeyboardButton(text='Назад', callback_data=PersonalOrdersCallbackData(flag=False).pack())
+        prev_button = InlineKeyboardButton(
+            text='Назад', callback_data=cursor.model_copy(update={'forward': False}).pack(),
+        )
         buttons.append(prev_button)
 
     if has_next:
-        next_button = InlineKeyboardButton(text='Вперед', callback_data=PersonalOrdersCallbackData(flag=True).pack())
+        next_button = InlineKeyboardButton(
+            text='Вперед', callback_data=cursor.model_copy(update={'forward': True}).pack(),
+        )
         buttons.append(next_button)
 
+    gallery_button = InlineKeyboardButton(
+        text='Все фото', callback_data=ItemGalleryCallbackData(item_id=cursor.item_id).pack(),
+    )
+
     show_cart_button = InlineKeyboardButton(text='Моя корзина', callback_data='show_cart')
     back_to_main_menu_button = InlineKeyboardButton(text='Вернуться в главное меню', callback_data='back_to_main_menu')
 
@@ -71,6 +81,7 @@ async def bought_items_markup(has_next: bool, has_prev: bool, **kwargs) -> Inlin
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
             buttons,
+            [gallery_button],
             [show_cart_button],
             [support_button],
             [back_to_main_menu_button],
@@ -1,6 +1,6 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from callback_data.callback_data import AvailableItemsCallbackData
+from callback_data.callback_data import AvailableItemsCallbackData, ItemGalleryCallbackData
 from conf import bot_settings
 
 
@@ -51,14 +51,25 @@ async def items_markup(has_next: bool, has_prev: bool, **kwargs) -> InlineKeyboa
 
     back_to_main_menu_button = InlineKeyboardButton(text='Вернуться в главное меню', callback_data='back_to_main_menu')
 
+    # Курсор показанного товара: кнопки листания несут его в callback data вместе с фильтрами.
+    cursor: AvailableItemsCallbackData = kwargs.get('cursor', AvailableItemsCallbackData())
+
     if has_prev:
-        prev_button = InlineKeyboardButton(text='Назад', callback_data=AvailableItemsCallbackData(flag=False).pack())
+        prev_button = InlineKeyboardButton(
+            text='Назад', callback_data=cursor.model_copy(update={'forward': False}).pack(),
+        )
         pagination_buttons.append(prev_button)
 
     if has_next:
-        next_button = InlineKeyboardButton(text='Вперед', callback_data=AvailableItemsCallbackData(flag=True).pack())
+        next_button = InlineKeyboardButton(
+            text='Вперед', callback_data=cursor.model_copy(update={'forward': True}).pack(),
+        )
         pagination_buttons.append(next_button)
 
+    gallery_button = InlineKeyboardButton(
+        text='Все фото', callback_data=ItemGalleryCallbackData(item_id=cursor.last_id).pack(),
+    )
+
     update_cart = kwargs.get('update_cart')
 
     add_to_cart_button = InlineKeyboardButton(
@@ -98,6 +109,7 @@ async def items_markup(has_next: bool, has_prev: bool, **kwargs) -> InlineKeyboa
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
             pagination_buttons,
+            [gallery_button],
             [add_to_cart_button],
             [delete_from_cart_button] if update_cart > 0 else [],
             [current_filter_button],
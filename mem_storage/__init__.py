@@ -1 +0,0 @@
-from .paginator import paginator_storage
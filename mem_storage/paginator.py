@@ -1,4 +0,0 @@
-from utils.paginator import PaginatorStorage
-
-
-paginator_storage = PaginatorStorage()
@@ -1,8 +1,7 @@
 from typing import Callable, Awaitable, Dict, Any, Union
 
 from aiogram import BaseMiddleware
-from aiogram.fsm.context import FSMContext, StorageKey
-from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
 from conf import bot_settings
@@ -16,10 +15,6 @@ from utils.jinja_template import render_template
 
 class AuthUserMiddleware(BaseMiddleware):
 
-    def __init__(self, storage: RedisStorage):
-        super().__init__()
-        self._storage = storage
-
     async def __call__(
             self,
             handler: Callable[[Union[Message, CallbackQuery], Dict[str, Any]], Awaitable[Any]],
@@ -27,16 +22,12 @@ class AuthUserMiddleware(BaseMiddleware):
             data: Dict[str, Any],
     ):
 
-        auth_state = await check_auth_state(event)
+        redis = data['redis']
+
+        auth_state = await check_auth_state(event, redis)
 
-        state = FSMContext(
-            storage=self._storage,
-            key=StorageKey(
-                bot_id=event.bot.id,
-                chat_id=event.from_user.id if isinstance(event, Message) else event.message.chat.id,
-                user_id=event.from_user.id if isinstance(event, Message) else event.from_user.id
-            )
-        )
+        # Контекст уже загружен FSMUnitOfWorkMiddleware, изменения будут записаны после обработки апдейта.
+        state: FSMContext = data['state']
         print(auth_state, await state.get_state())
 
         if isinstance(event, Message):
@@ -71,7 +62,7 @@ class AuthUserMiddleware(BaseMiddleware):
                 elif curr_state == RestoreState.NEW_PASSWORD_CONFIRMATION:
                     return await confirm_new_password_handler(event_type, state)
                 elif curr_state == InitialState.TO_AUTHENTICATION:
-                    return await authenticate_user(event_type, state)
+                    return await authenticate_user(event_type, state, redis)
                 else:
                     if isinstance(event, Message) and event.text and event.text.startswith('/'):
                         await state.set_state(InitialState.TO_AUTHENTICATION)
@@ -16,15 +16,14 @@ class CartIsFullFiledMiddleware(BaseMiddleware):
             data: Dict[str, Any]
     ):
 
-        tg_id = event.message.chat.id
-
-        cart = await CartManager.get_cart(tg_id)
+        if event.data != 'add_to_cart':
+            return await handler(event, data)
 
-        query_text = event.data
+        tg_id = event.message.chat.id
 
-        items = await cart.get_items
+        cart = await CartManager.get_cart(tg_id, data['redis'])
 
-        if items and len(items) >= CART_OVERFLOW and query_text == 'add_to_cart':
+        if await cart.count_items() >= CART_OVERFLOW:
             return await event.answer(
                 text='Ваша корзина переполнена. Пожалуйста, удалите элементы корзины либо оплатите, '
                      'чтобы продолжить покупки.'
@@ -0,0 +1,80 @@
+import contextlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseEventIsolation, StorageKey
+from aiogram.types import TelegramObject
+
+from middlewares.utils.context import BufferedFSMContext
+from utils.keyed_lock import KeyedLock
+
+
+class KeyedEventIsolation(BaseEventIsolation):
+    """ Апдейты одного пользователя обрабатываются по очереди, апдейты разных пользователей - параллельно.
+
+    В отличие от SimpleEventIsolation, замки освобожденных ключей удаляются.
+    Изоляция действует в пределах процесса.
+    """
+
+    def __init__(self):
+        self._locks = KeyedLock()
+
+    @contextlib.asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncIterator[None]:
+        async with self._locks(key):
+            yield
+
+    async def close(self) -> None:
+        pass
+
+
+class FSMUnitOfWorkMiddleware(FSMContextMiddleware):
+    """ Заменяет FSMContextMiddleware диспетчера.
+
+    Состояние и данные FSM читаются одним пайплайном до обработки апдейта,
+    а изменения записываются одним пайплайном после нее.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+
+        bot: Bot = data['bot']
+        context = self.resolve_event_context(bot, data)
+        data['fsm_storage'] = self.storage
+
+        if context is None:
+            return await handler(event, data)
+
+        async with self.events_isolation.lock(key=context.key):
+            await context.load()
+            data.update({'state': context, 'raw_state': await context.get_state()})
+
+            try:
+                return await handler(event, data)
+            finally:
+                await context.flush()
+
+    def get_context(
+            self,
+            bot: Bot,
+            chat_id: int,
+            user_id: int,
+            thread_id: Optional[int] = None,
+            destiny: str = DEFAULT_DESTINY,
+    ) -> BufferedFSMContext:
+
+        return BufferedFSMContext(
+            storage=self.storage,
+            key=StorageKey(
+                user_id=user_id,
+                chat_id=chat_id,
+                bot_id=bot.id,
+                thread_id=thread_id,
+                destiny=destiny,
+            ),
+        )
@@ -2,3 +2,24 @@ from typing import Final
 
 AUTH_PERIOD: Final[int] = 3600
 CART_OVERFLOW: Final[int] = 20
+REGISTERED_USERS_CAPACITY: Final[int] = 100000
+REGISTERED_USERS_ERROR_RATE: Final[float] = 0.001
+CART_TTL: Final[int] = 7 * 24 * 3600
+CATALOG_INDEX_REFRESH_INTERVAL: Final[int] = 30
+# Битовый индекс держит по множеству на бренд и ключ фильтра: на 1 000 000 товаров это порядка сотни МиБ на процесс.
+# Без индекса выдачи по фильтрам берутся из общего кеша в Redis.
+CATALOG_INDEX_ENABLED: Final[bool] = True
+CATALOG_CACHE_TTL: Final[int] = 300
+IMAGE_WARMUP_CONCURRENCY: Final[int] = 4
+IMAGE_WARMUP_INTERVAL: Final[int] = 60
+# Производные изображения каталога: JPEG не больше IMAGE_MAX_SIDE по большей стороне, имя файла - sha256 содержимого.
+IMAGE_MEDIA_ROOT: Final[str] = 'media/derivatives'
+IMAGE_MAX_SIDE: Final[int] = 1280
+IMAGE_JPEG_QUALITY: Final[int] = 85
+IMAGE_OPTIMIZE_WORKERS: Final[int] = 2
+# Сколько изображений обрабатывается одновременно и записывается одной транзакцией.
+IMAGE_OPTIMIZE_BATCH: Final[int] = 200
+# sha256 файлов изображений в памяти процесса (TelegramFileCache): не больше записей и время простоя записи.
+FILE_DIGESTS_MAX_ENTRIES: Final[int] = 50000
+FILE_DIGESTS_IDLE_TTL: Final[int] = 24 * 3600
+FILE_DIGESTS_SWEEP_INTERVAL: Final[int] = 600
@@ -68,7 +68,7 @@ class TestAuthState(unittest.IsolatedAsyncioTestCase):
             nonlocal message
 
             async with lock:
-                signal = await check_auth_state(message)
+                signal = await check_auth_state(message, self.r_con)
                 self.assertEqual(signal, Signal.NOT_REGISTERED)
 
         async def check_auth_state_not_authenticated(lock):
@@ -86,14 +86,14 @@ class TestAuthState(unittest.IsolatedAsyncioTestCase):
                 await transaction.rollback()
 
             async with lock:
-                signal = await check_auth_state(message)
+                signal = await check_auth_state(message, self.r_con)
                 self.assertEqual(signal, Signal.NOT_AUTHENTICATED)
 
         async def check_auth_state_authenticated(lock):
             nonlocal message
 
             async with lock:
-                signal = await check_auth_state(message)
+                signal = await check_auth_state(message, self.r_con)
                 self.assertEqual(signal, Signal.AUTHENTICATED)
 
         async def check_auth_state_registered_but_not_authenticated(lock):
@@ -101,7 +101,7 @@ class TestAuthState(unittest.IsolatedAsyncioTestCase):
 
             async with lock:
                 with patch('middlewares.utils.state.AUTH_PERIOD', new=-1):
-                    signal = await check_auth_state(message)
+                    signal = await check_auth_state(message, self.r_con)
                     self.assertEqual(signal, Signal.NOT_AUTHENTICATED)
 
         self.loop.run_until_complete(check_auth_state_registered(self.lock))
@@ -0,0 +1,80 @@
+import copy
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType
+
+
+class BufferedFSMContext(FSMContext):
+    """ FSMContext, который работает с копией состояния и данных в памяти.
+
+    load() читает запись из хранилища, flush() записывает обратно только изменившиеся ключи данных и состояние.
+    Хранилище должно поддерживать get_record() и set_record(), см. RedisHashStorage.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self._state: Optional[str] = None
+        self._data: Dict[str, Any] = {}
+
+        self._stored_state: Optional[str] = None
+        self._stored_data: Dict[str, Any] = {}
+
+    async def load(self) -> None:
+
+        self._stored_state, self._stored_data = await self.storage.get_record(key=self.key)
+
+        self._state = self._stored_state
+        self._data = copy.deepcopy(self._stored_data)
+
+    async def flush(self) -> bool:
+
+        state_changed = self._state != self._stored_state
+
+        changed = {
+            field: value
+            for field, value in self._data.items()
+            if field not in self._stored_data or self._stored_data[field] != value
+        }
+        removed = [field for field in self._stored_data if field not in self._data]
+
+        if not state_changed and not changed and not removed:
+            return False
+
+        await self.storage.set_record(
+            key=self.key,
+            state=self._state,
+            changed=changed,
+            removed=removed,
+            write_state=state_changed,
+        )
+
+        self._stored_state = self._state
+        self._stored_data = copy.deepcopy(self._data)
+
+        return True
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+
+    async def get_state(self) -> Optional[str]:
+        return self._state
+
+    async def set_data(self, data: Dict[str, Any]) -> None:
+        self._data = copy.deepcopy(data)
+
+    async def get_data(self) -> Dict[str, Any]:
+        return copy.deepcopy(self._data)
+
+    async def update_data(
+            self, data: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+
+        if data:
+            kwargs.update(data)
+
+        self._data.update(copy.deepcopy(kwargs))
+
+        return copy.deepcopy(self._data)
@@ -1,28 +1,122 @@
+import functools
 import logging
 import time
 
 import sqlalchemy.exc
 from aiogram.types import Message
+from aioredis import Redis
+from aioredis.client import Script
+from sqlalchemy import select
 
 from database.models import Users, Credentials
 from database.session import AsyncSessionLocal
 from database.models.exceptions.models_exc import UserNotFound
-from database.handlers.utils.redis_client import connect_redis_url
-from middlewares.settings import AUTH_PERIOD
+from database.handlers.utils.redis_bloom_filter import RedisBloomFilter
+from middlewares.settings import AUTH_PERIOD, REGISTERED_USERS_CAPACITY, REGISTERED_USERS_ERROR_RATE
 from signals.signals import Signal
 
 
+# Зарегистрированные tg_id: отсутствие в фильтре означает, что пользователь точно не зарегистрирован.
+registered_users = RedisBloomFilter('registered_users', REGISTERED_USERS_CAPACITY, REGISTERED_USERS_ERROR_RATE)
+
+
+# Проверка, валидация и продление сессии за один запрос к Redis.
+# Сессия живет, пока жив ключ: срок действия задается TTL ключа и сдвигается при каждом обращении.
+# Ключи без TTL (созданные до перехода на TTL) один раз проверяются по last_seen.
+# Если сессии нет, биты tg_id проверяются в фильтре зарегистрированных пользователей (KEYS[2], позиции в ARGV[3..]).
+# Возвращает значение Signal либо 0, если нужно свериться с базой.
+CHECK_AUTH_SESSION_LUA = """
+local ttl = redis.call('TTL', KEYS[1])
+if ttl == -2 then
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        for i = 3, #ARGV do
+            if redis.call('GETBIT', KEYS[2], ARGV[i]) == 0 then
+                return %(not_registered)d
+            end
+        end
+    end
+    return 0
+end
+
+if redis.call('HEXISTS', KEYS[1], 'hash') == 0 then
+    return %(unknown_error)d
+end
+
+local period = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+
+if ttl == -1 then
+    local last_seen = tonumber(redis.call('HGET', KEYS[1], 'last_seen'))
+    if not last_seen then
+        return %(unknown_error)d
+    end
+    if now - last_seen > period then
+        period = 0
+    end
+end
+
+if period <= 0 then
+    redis.call('DEL', KEYS[1])
+    return %(not_authenticated)d
+end
+
+redis.call('HSET', KEYS[1], 'last_seen', now)
+redis.call('EXPIRE', KEYS[1], period)
+
+return %(authenticated)d
+""" % {
+    'not_registered': Signal.NOT_REGISTERED.value,
+    'unknown_error': Signal.UNKNOWN_ERROR.value,
+    'not_authenticated': Signal.NOT_AUTHENTICATED.value,
+    'authenticated': Signal.AUTHENTICATED.value,
+}
+
+
+@functools.cache
+def _check_auth_session_script(r_cli: Redis) -> Script:
+    return r_cli.register_script(CHECK_AUTH_SESSION_LUA)
+
+
+async def start_auth_session(
+        r_cli: Redis,
+        tg_id: int,
+        auth_hash: str,
+        last_seen: int,
+) -> None:
+
+    async with r_cli.pipeline(transaction=True) as pipe:
+        pipe.hset(f'auth_hash:{tg_id}', mapping={
+            'hash': auth_hash,
+            'last_seen': last_seen,
+        })
+        pipe.expire(f'auth_hash:{tg_id}', AUTH_PERIOD)
+        await pipe.execute()
+
+
+async def rebuild_registered_users(r_cli: Redis) -> int:
+
+    rebuild_key = await registered_users.begin_rebuild(r_cli)
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            tg_ids = await session.scalars(select(Users.tg_id))
+
+            return await registered_users.finish_rebuild(r_cli, rebuild_key, tg_ids)
+
+
 async def check_auth_state(
         message: Message,
+        r_cli: Redis,
 ) -> Signal:
 
     tg_id = message.from_user.id
 
-    r_cli = await connect_redis_url()
-
-    auth_hash_presents_in_redis = await r_cli.exists(f'auth_hash:{tg_id}')
+    session_state = await _check_auth_session_script(r_cli)(
+        keys=[f'auth_hash:{tg_id}', registered_users.key],
+        args=[AUTH_PERIOD, int(time.time()), *registered_users.positions(tg_id)],
+    )
 
-    if not auth_hash_presents_in_redis:
+    if not session_state:
 
         try:
             async with AsyncSessionLocal() as session:
@@ -39,17 +133,5 @@ async def check_auth_state(
         except sqlalchemy.exc.SQLAlchemyError as sql_err:
             logging.getLogger(__name__).error(str(sql_err))
             return Signal.DATABASE_ERROR
-    else:
-
-        now = int(time.time())
-
-        last_seen = await r_cli.hget(f'auth_hash:{tg_id}', 'last_seen')
-        last_seen = int(last_seen)
-
-        if not last_seen:
-            return Signal.UNKNOWN_ERROR
 
-        if now - last_seen > AUTH_PERIOD:
-            return Signal.NOT_AUTHENTICATED
-        else:
-            return Signal.AUTHENTICATED
+    return Signal(session_state)
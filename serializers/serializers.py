@@ -1,35 +1,93 @@
+import json
 from decimal import Decimal
 from enum import Enum
-from typing import Any
+from typing import Any, Iterable, Protocol, Type
 
+import msgpack
 
-class RedisSerializer:
-    def __init__(self, struct: dict):
-        self._struct = struct
 
-    async def __call__(self, *args, **kwargs):
+class Codec(Protocol):
+    """ Кодек значений для хранилища FSM. """
 
-        for key, value in self._struct.items():
-            if not isinstance(value, (int, float, str)):
-                self._struct[key] = await self.__serialize(value)
+    def dumps(self, value: Any) -> bytes:
+        ...
 
-        return self._struct
+    def loads(self, data: bytes) -> Any:
+        ...
+
+
+class JsonCodec:
+    """ JSON-кодек. Decimal превращается в float, Enum - в имя элемента, кортежи - в списки. """
 
     @staticmethod
-    async def __serialize(value: Any):
+    def _default(value: Any):
         """ Дополняется по мере необходимости. """
 
         if isinstance(value, Enum):
             return value.name
         if isinstance(value, Decimal):
             return float(value)
-        if isinstance(value, str):
-            return str(value)
-        if isinstance(value, list):
-            serialized_value = []
-            for v in value:
-                new_val = await RedisSerializer.__serialize(v)
-                serialized_value.append(new_val)
 
-            return serialized_value
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=self._default, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class MsgPackCodec:
+    """ Бинарный кодек на msgpack.
+
+    Decimal, Enum и кортежи передаются через типы-расширения и восстанавливаются без потерь.
+    Enum восстанавливается, только если его класс зарегистрирован, иначе возвращается имя элемента.
+    """
+
+    DECIMAL = 1
+    ENUM = 2
+    TUPLE = 3
+
+    def __init__(self, enums: Iterable[Type[Enum]] = ()) -> None:
+        self._enums = {}
+
+        for enum_cls in enums:
+            self.register_enum(enum_cls)
+
+    @staticmethod
+    def _enum_name(enum_cls: Type[Enum]) -> str:
+        return f'{enum_cls.__module__}.{enum_cls.__qualname__}'
+
+    def register_enum(self, enum_cls: Type[Enum]) -> None:
+        self._enums[self._enum_name(enum_cls)] = enum_cls
+
+    def _default(self, value: Any):
+
+        if isinstance(value, Decimal):
+            return msgpack.ExtType(self.DECIMAL, str(value).encode('ascii'))
+        if isinstance(value, Enum):
+            return msgpack.ExtType(self.ENUM, self.dumps([self._enum_name(type(value)), value.name]))
+        if isinstance(value, tuple):
+            return msgpack.ExtType(self.TUPLE, self.dumps(list(value)))
+
+        raise TypeError(f'Object of type {type(value).__name__} is not msgpack serializable')
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+
+        if code == self.DECIMAL:
+            return Decimal(data.decode('ascii'))
+        if code == self.ENUM:
+            enum_name, member_name = self.loads(data)
+            enum_cls = self._enums.get(enum_name)
+            return enum_cls[member_name] if enum_cls is not None else member_name
+        if code == self.TUPLE:
+            return tuple(self.loads(data))
+
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, value: Any) -> bytes:
+        # strict_types отправляет кортежи и наследников str/int (например, Enum) в _default.
+        return msgpack.packb(value, default=self._default, strict_types=True, use_bin_type=True)
 
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
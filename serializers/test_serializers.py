@@ -0,0 +1,54 @@
+import enum
+import unittest
+from decimal import Decimal
+
+from serializers import JsonCodec, MsgPackCodec
+
+
+class Gender(enum.Enum):
+    male = 'male'
+    female = 'female'
+
+
+class TestMsgPackCodec(unittest.TestCase):
+
+    codec = MsgPackCodec(enums=[Gender])
+
+    def test001_round_trip(self):
+
+        value = {
+            'current_item': {'id': 1, 'title': 'Кроссовки', 'price': Decimal('12990.50')},
+            'shipping_addresses': {7: ('RU', 'Москва', 'Тверская', None, '79990000000')},
+            'sex': Gender.female,
+            'has_next': True,
+        }
+
+        self.assertEqual(self.codec.loads(self.codec.dumps(value)), value)
+
+    def test002_types_are_preserved(self):
+
+        value = self.codec.loads(self.codec.dumps([Decimal('1.10'), (1, 2), Gender.male]))
+
+        self.assertIsInstance(value[0], Decimal)
+        self.assertEqual(str(value[0]), '1.10')
+        self.assertIsInstance(value[1], tuple)
+        self.assertIs(value[2], Gender.male)
+
+    def test003_unregistered_enum_decodes_to_name(self):
+
+        self.assertEqual(MsgPackCodec().loads(self.codec.dumps(Gender.male)), 'male')
+
+
+class TestJsonCodec(unittest.TestCase):
+
+    def test001_decimal_and_enum(self):
+
+        codec = JsonCodec()
+
+        self.assertEqual(codec.loads(codec.dumps({'price': Decimal('1.5'), 'sex': Gender.male})),
+                         {'price': 1.5, 'sex': 'male'})
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMsgPackCodec)
+    unittest.TextTestRunner(failfast=False).run(suite)
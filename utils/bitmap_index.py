@@ -0,0 +1,91 @@
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+def _bitset(ids: List[int]) -> int:
+    """ Битовое множество из списка id: бит с номером id выставлен, если id есть в списке. """
+
+    if not ids:
+        return 0
+
+    bits = bytearray(max(ids) // 8 + 1)
+
+    for value in ids:
+        bits[value >> 3] |= 1 << (value & 7)
+
+    return int.from_bytes(bits, 'little')
+
+
+class BitmapIndex:
+    """ Инвертированный индекс «терм -> битовое множество id» на целых числах Python.
+
+    Пересечение термов - побитовое И, следующий id после курсора - младший выставленный бит
+    в сдвинутом множестве, поэтому поиск не перебирает id по одному.
+    """
+
+    def __init__(self, bitsets: Dict[Hashable, int], universe: int, version: int = 0) -> None:
+        self._bitsets = bitsets
+        self._universe = universe
+        self.version = version
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, Iterable[Hashable]]], version: int = 0) -> 'BitmapIndex':
+        """ Строит индекс из пар (id, термы id). """
+
+        postings: Dict[Hashable, List[int]] = {}
+        ids = []
+
+        for item_id, terms in rows:
+            ids.append(item_id)
+            for term in terms:
+                postings.setdefault(term, []).append(item_id)
+
+        # Множество собирается в bytearray целиком: побитовое ИЛИ по одному id копировало бы его на каждом шаге.
+        return cls({term: _bitset(term_ids) for term, term_ids in postings.items()}, _bitset(ids), version)
+
+    def __len__(self) -> int:
+        return self._universe.bit_count()
+
+    def match(self, *terms: Hashable) -> int:
+        """ Множество id, у которых есть все термы. Без термов - все id индекса. """
+
+        bits = self._universe
+
+        for term in terms:
+            bits &= self._bitsets.get(term, 0)
+
+        return bits
+
+    @staticmethod
+    def after(bits: int, last_id: int, limit: int) -> List[int]:
+        """ До limit id из bits больше last_id по возрастанию. """
+
+        bits >>= last_id + 1
+        offset = last_id + 1
+        found = []
+
+        while bits and len(found) < limit:
+            lowest = (bits & -bits).bit_length() - 1
+            found.append(offset + lowest)
+            bits >>= lowest + 1
+            offset += lowest + 1
+
+        return found
+
+    @staticmethod
+    def before(bits: int, last_id: int, limit: int) -> List[int]:
+        """ До limit id из bits меньше last_id по убыванию. """
+
+        bits &= (1 << max(last_id, 0)) - 1
+        found = []
+
+        while bits and len(found) < limit:
+            highest = bits.bit_length() - 1
+            found.append(highest)
+            bits ^= 1 << highest
+
+        return found
+
+    def memory_size(self) -> int:
+        """ Примерный объем битовых множеств в байтах. """
+
+        return sum((bits.bit_length() + 7) // 8 for bits in self._bitsets.values()) + (self._universe.bit_length() + 7) // 8
@@ -0,0 +1,50 @@
+import hashlib
+import math
+from typing import Iterable, List
+
+
+class BloomFilter:
+    """ Фильтр Блума для целочисленных идентификаторов.
+
+    Биты хранятся в том же порядке, что и у SETBIT в Redis (старший бит байта идет первым),
+    поэтому to_bytes() можно записать в Redis как есть.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+
+        if capacity <= 0:
+            raise ValueError('capacity должна быть больше нуля.')
+
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate должна лежать в интервале (0, 1).')
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+
+        self._bits = bytearray(math.ceil(self.size / 8))
+
+    def positions(self, value: int) -> List[int]:
+
+        digest = hashlib.blake2b(value.to_bytes(8, 'big', signed=True), digest_size=16).digest()
+
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: int) -> None:
+        for position in self.positions(value):
+            self._bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def update(self, values: Iterable[int]) -> None:
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value: int) -> bool:
+        return all(self._bits[position >> 3] & (0x80 >> (position & 7)) for position in self.positions(value))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
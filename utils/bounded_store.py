@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Hashable, Optional
+
+
+@dataclass
+class StoreMetrics:
+    """ Счетчики хранилища. size - число записей, weight - их суммарный вес. """
+
+    size: int = 0
+    weight: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class BoundedStore:
+    """ Словарь в памяти процесса с ограничением по весу записей и времени простоя.
+
+    Вес записи считается функцией weigher (по умолчанию каждая запись весит 1).
+    При превышении max_weight вытесняются давно не использованные записи (LRU),
+    записи, к которым не обращались дольше idle_ttl секунд, удаляются при чтении и фоновым sweeper'ом.
+    """
+
+    def __init__(
+            self,
+            max_weight: int,
+            idle_ttl: float,
+            weigher: Callable[[Any], int] = lambda value: 1,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_weight = max_weight
+        self.idle_ttl = idle_ttl
+        self.metrics = StoreMetrics()
+
+        self._weigher = weigher
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple] = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.metrics.misses += 1
+            return default
+
+        value, weight, touched_at = entry
+        now = self._clock()
+
+        if now - touched_at > self.idle_ttl:
+            self._remove(key)
+            self.metrics.expirations += 1
+            self.metrics.misses += 1
+            return default
+
+        self._entries[key] = value, weight, now
+        self._entries.move_to_end(key)
+        self.metrics.hits += 1
+
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+
+        if key in self._entries:
+            self._remove(key)
+
+        weight = self._weigher(value)
+
+        self._entries[key] = value, weight, self._clock()
+        self.metrics.size += 1
+        self.metrics.weight += weight
+
+        # Последняя запись не вытесняется, даже если сама по себе тяжелее max_weight.
+        while self.metrics.weight > self.max_weight and len(self._entries) > 1:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.metrics.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+
+        if key not in self._entries:
+            return default
+
+        value, _, _ = self._entries[key]
+        self._remove(key)
+
+        return value
+
+    def sweep(self) -> int:
+        """ Удаляет записи, простоявшие дольше idle_ttl. Возвращает количество удаленных записей. """
+
+        deadline = self._clock() - self.idle_ttl
+        expired = 0
+
+        # Записи упорядочены по времени последнего обращения, поэтому достаточно пройти до первой живой.
+        while self._entries:
+            key, (_, _, touched_at) = next(iter(self._entries.items()))
+            if touched_at > deadline:
+                break
+            self._remove(key)
+            expired += 1
+
+        self.metrics.expirations += expired
+
+        return expired
+
+    def start_sweeper(self, interval: float) -> None:
+
+        async def sweep_forever():
+            while True:
+                await asyncio.sleep(interval)
+                self.sweep()
+
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(sweep_forever())
+
+    async def stop_sweeper(self) -> None:
+
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+
+    def _remove(self, key: Hashable) -> None:
+
+        _, weight, _ = self._entries.pop(key)
+        self.metrics.size -= 1
+        self.metrics.weight -= weight
@@ -0,0 +1,59 @@
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageOps
+
+
+def encode_derivative(source_path: str, max_side: int, quality: int) -> bytes:
+    """ JPEG для Telegram: не больше max_side по большей стороне, с учетом поворота из EXIF.
+
+    Если исходник уже JPEG подходящего размера и меньше перекодированного файла, возвращается он сам.
+    """
+
+    with Image.open(source_path) as image:
+        source_format = image.format
+
+        image = ImageOps.exif_transpose(image)
+        fits = max(image.size) <= max_side
+
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+
+    derivative = output.getvalue()
+
+    if source_format == 'JPEG' and fits and os.path.getsize(source_path) <= len(derivative):
+        with open(source_path, 'rb') as source:
+            return source.read()
+
+    return derivative
+
+
+def store_derivative(source_path: str, media_root: str, max_side: int, quality: int) -> str:
+    """ Сохраняет производное изображение под именем из sha256 содержимого и возвращает путь к нему.
+
+    Одинаковые изображения разных товаров попадают в один файл.
+    Выполняется в процессе пула: перекодирование занимает процессор на сотни миллисекунд.
+    """
+
+    derivative = encode_derivative(source_path, max_side, quality)
+    digest = hashlib.sha256(derivative).hexdigest()
+
+    directory = os.path.join(media_root, digest[:2])
+    path = os.path.join(directory, f'{digest}.jpg')
+
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+
+        # Запись во временный файл и rename: параллельная обработка того же изображения не увидит половину файла.
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(derivative)
+        os.replace(temp_path, path)
+
+    return path
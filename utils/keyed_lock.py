@@ -0,0 +1,35 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Dict, Hashable
+
+
+class KeyedLock:
+    """ Отдельный asyncio.Lock на каждый ключ.
+
+    Задачи с разными ключами не ждут друг друга. Замок удаляется, как только его не держит и не ждет ни одна задача,
+    поэтому словарь замков не растет с числом пользователей.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._holders: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, key: Hashable) -> AsyncIterator[None]:
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        self._holders[key] = self._holders.get(key, 0) + 1
+
+        try:
+            async with lock:
+                yield
+        finally:
+            self._holders[key] -= 1
+            if not self._holders[key]:
+                del self._holders[key], self._locks[key]
@@ -1,4 +1,3 @@
-import asyncio
 from typing import List
 
 
@@ -44,23 +43,3 @@ class Paginator:
     def has_prev(self) -> bool:
 
         return self._current > 0
-
-
-class PaginatorStorage:
-
-    def __init__(self):
-        self.storage = {}
-        self.lock = asyncio.Lock()
-
-    async def __aenter__(self):
-        await self.lock.acquire()
-
-    def __setitem__(self, key, value):
-        self.storage[key] = value
-
-    def __getitem__(self, item):
-        if item is not None:
-            return self.storage.get(item)
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        self.lock.release()
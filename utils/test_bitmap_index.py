@@ -0,0 +1,49 @@
+import unittest
+from bitmap_index import BitmapIndex
+
+
+class TestBitmapIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.index = BitmapIndex.build([
+            (1, [('brand', 1), ('key', 10)]),
+            (4, [('brand', 2), ('key', 10)]),
+            (9, [('brand', 1), ('key', 20)]),
+            (130, [('brand', 1), ('key', 10), ('key', 20)]),
+        ], version=3)
+
+    def test001_match_intersects_terms(self):
+
+        bits = self.index.match(('brand', 1), ('key', 10))
+
+        self.assertEqual(BitmapIndex.after(bits, 0, 10), [1, 130])
+        self.assertEqual(self.index.match(('brand', 3)), 0)
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.version, 3)
+
+    def test002_after_and_before_follow_keyset(self):
+
+        bits = self.index.match()
+
+        self.assertEqual(BitmapIndex.after(bits, 0, 2), [1, 4])
+        self.assertEqual(BitmapIndex.after(bits, 4, 2), [9, 130])
+        self.assertEqual(BitmapIndex.after(bits, 130, 2), [])
+        self.assertEqual(BitmapIndex.before(bits, 130, 2), [9, 4])
+        self.assertEqual(BitmapIndex.before(bits, 1, 2), [])
+
+    def test003_matches_brute_force(self):
+
+        rows = [(item_id, [('key', item_id % 7), ('brand', item_id % 3)]) for item_id in range(1, 5000, 3)]
+        index = BitmapIndex.build(rows)
+
+        expected = [item_id for item_id, terms in rows if ('key', 2) in terms and ('brand', 1) in terms]
+        bits = index.match(('key', 2), ('brand', 1))
+
+        self.assertEqual(BitmapIndex.after(bits, 0, len(rows)), expected)
+        self.assertEqual(BitmapIndex.before(bits, 5000, len(rows)), expected[::-1])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBitmapIndex)
+    unittest.TextTestRunner(failfast=False).run(suite)
@@ -0,0 +1,38 @@
+import unittest
+from bloom_filter import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test001_no_false_negatives(self):
+
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        bloom_filter.update(range(0, 2000, 2))
+
+        for value in range(0, 2000, 2):
+            self.assertIn(value, bloom_filter)
+
+    def test002_false_positive_rate(self):
+
+        bloom_filter = BloomFilter(capacity=10000, error_rate=0.01)
+        bloom_filter.update(range(10000))
+
+        false_positives = sum(value in bloom_filter for value in range(10000, 110000))
+
+        self.assertLess(false_positives / 100000, 0.02)
+
+    def test003_redis_bit_order(self):
+
+        bloom_filter = BloomFilter(capacity=10, error_rate=0.1)
+        bloom_filter.add(42)
+
+        bits = bloom_filter.to_bytes()
+
+        for position in bloom_filter.positions(42):
+            byte = bits[position // 8]
+            self.assertTrue(byte >> (7 - position % 8) & 1)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBloomFilter)
+    unittest.TextTestRunner(failfast=False).run(suite)
@@ -0,0 +1,63 @@
+import unittest
+from bounded_store import BoundedStore
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBoundedStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test001_lru_eviction_by_weight(self):
+
+        store = BoundedStore(max_weight=5, idle_ttl=60, weigher=len, clock=self.clock)
+        store.set('a', [1, 2])
+        store.set('b', [1, 2])
+        store.get('a')
+        store.set('c', [1, 2])
+
+        self.assertNotIn('b', store)
+        self.assertEqual(store.get('a'), [1, 2])
+        self.assertEqual(store.metrics.evictions, 1)
+        self.assertEqual(store.metrics.weight, 4)
+
+    def test002_idle_ttl(self):
+
+        store = BoundedStore(max_weight=10, idle_ttl=60, clock=self.clock)
+        store.set('a', 1)
+        store.set('b', 2)
+
+        self.clock.now = 50
+        store.get('b')
+
+        self.clock.now = 100
+        self.assertEqual(store.sweep(), 1)
+        self.assertEqual(store.get('b'), 2)
+
+        self.clock.now = 200
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.metrics.expirations, 2)
+
+    def test003_counters(self):
+
+        store = BoundedStore(max_weight=10, idle_ttl=60, clock=self.clock)
+        store.set('a', 1)
+        store.get('a')
+        store.get('b')
+
+        self.assertEqual(store.metrics.as_dict(), {
+            'size': 1, 'weight': 1, 'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0,
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from image_derivatives import encode_derivative, store_derivative
+
+
+class TestImageDerivatives(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.media_root = os.path.join(self.directory.name, 'derivatives')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def image(self, name: str, size: tuple, mode: str = 'RGB') -> str:
+
+        path = os.path.join(self.directory.name, name)
+        Image.effect_noise(size, 64).convert(mode).save(path)
+
+        return path
+
+    def test001_bounds_dimensions(self):
+
+        path = self.image('large.png', (2000, 1500), mode='RGBA')
+
+        with Image.open(store_derivative(path, self.media_root, 1280, 85)) as derivative:
+            self.assertEqual(derivative.format, 'JPEG')
+            self.assertEqual(derivative.size, (1280, 960))
+
+    def test002_same_content_is_stored_once(self):
+
+        first = self.image('first.png', (1500, 1500))
+        second = os.path.join(self.directory.name, 'second.png')
+
+        with open(first, 'rb') as source, open(second, 'wb') as copy:
+            copy.write(source.read())
+
+        self.assertEqual(
+            store_derivative(first, self.media_root, 1280, 85),
+            store_derivative(second, self.media_root, 1280, 85),
+        )
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.media_root)), 1)
+
+    def test003_small_jpeg_is_kept(self):
+
+        path = os.path.join(self.directory.name, 'small.jpg')
+        Image.effect_noise((640, 480), 64).convert('RGB').save(path, 'JPEG', quality=40)
+
+        with open(path, 'rb') as source:
+            original = source.read()
+
+        # Перекодирование с качеством 95 дало бы файл больше исходника.
+        self.assertEqual(encode_derivative(path, 1280, 95), original)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestImageDerivatives)
+    unittest.TextTestRunner(failfast=False).run(suite)
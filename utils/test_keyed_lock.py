@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from keyed_lock import KeyedLock
+
+
+class TestKeyedLock(unittest.IsolatedAsyncioTestCase):
+
+    async def test001_same_key_is_serialized(self):
+
+        locks = KeyedLock()
+        events = []
+
+        async def worker(name):
+            async with locks('user'):
+                events.append(f'{name}:in')
+                await asyncio.sleep(0.01)
+                events.append(f'{name}:out')
+
+        await asyncio.gather(worker('a'), worker('b'))
+
+        self.assertEqual(events, ['a:in', 'a:out', 'b:in', 'b:out'])
+
+    async def test002_different_keys_run_concurrently(self):
+
+        locks = KeyedLock()
+        inside = set()
+        overlapped = asyncio.Event()
+
+        async def worker(key):
+            async with locks(key):
+                inside.add(key)
+                if len(inside) == 2:
+                    overlapped.set()
+                await asyncio.wait_for(overlapped.wait(), timeout=1)
+
+        await asyncio.gather(worker(1), worker(2))
+
+        self.assertTrue(overlapped.is_set())
+
+    async def test003_released_locks_are_dropped(self):
+
+        locks = KeyedLock()
+
+        async def worker(key):
+            async with locks(key):
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(worker(key % 10) for key in range(100)))
+
+        self.assertEqual(len(locks), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()